@@ -0,0 +1,42 @@
+import argparse
+import json
+import sys
+
+from .suite import SCALES, compare_to_baseline, run_suite
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Security Master")
+    parser.add_argument(
+        "--scale", nargs="+", choices=list(SCALES.keys()), default=["xs", "s"]
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("-o", "--output", type=str)
+    parser.add_argument("-b", "--baseline", type=str)
+    parser.add_argument("-t", "--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = run_suite(args.scale, args.seed, args.repeat)
+
+    if args.output:
+        with open(args.output, mode="w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, mode="r") as f:
+            baseline = json.load(f)
+
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+
+        for scale, benchmark, baseline_seconds, seconds in regressions:
+            timing = "failed" if seconds is None else f"{seconds:.4f}s"
+            print(
+                f"Regression in {benchmark} ({scale}): "
+                f"{baseline_seconds:.4f}s -> {timing}",
+                file=sys.stderr,
+            )
+
+        if len(regressions) > 0:
+            sys.exit(1)
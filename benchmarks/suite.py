@@ -0,0 +1,190 @@
+import platform
+import sys
+from datetime import datetime, timezone
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Any, Callable
+
+import pyarrow as pa  # type: ignore
+from sqlalchemy import MetaData, create_engine
+
+from hedgineer.collect import (
+    filter_by_asset_class,
+    generate_security_master,
+    join_positions,
+    join_positions_bulk,
+)
+from hedgineer.globals import ATTRIBUTE_PRIORITY
+from hedgineer.io import (
+    from_arrow,
+    from_pandas,
+    read_csv,
+    read_parquet,
+    read_parquet_dataset,
+    read_sql,
+    to_arrow,
+    to_pandas,
+    write_csv,
+    write_parquet,
+    write_parquet_dataset,
+    write_sql,
+)
+from hedgineer.merge import merge_audit_trail_update
+from hedgineer.synthetic import (
+    ASSET_CLASSES,
+    generate_synthetic_audit_trail,
+    generate_synthetic_positions,
+    generate_synthetic_update,
+)
+from hedgineer.types import SecurityMaster
+
+# name: (fact count, security count)
+SCALES = {
+    "xs": (1_000, 10),
+    "s": (10_000, 1_000),
+    "m": (100_000, 10_000),
+    "l": (1_000_000, 100_000),
+    "xl": (10_000_000, 1_000_000),
+}
+
+
+def time_call(
+    fn: Callable[[Any], Any], setup: Callable[[], Any] = lambda: None, repeat: int = 3
+) -> float:
+    # Best of `repeat` runs, setup is excluded from the timing
+    timings = []
+
+    for _ in range(repeat):
+        arg = setup()
+        start = perf_counter()
+        fn(arg)
+        timings.append(perf_counter() - start)
+
+    return min(timings)
+
+
+def copy_sm(sm: SecurityMaster) -> SecurityMaster:
+    return SecurityMaster.from_tuple(
+        (list(sm.header), list(sm.data), dict(sm.col_index)), validate=False
+    )
+
+
+def sql_round_trip(sm: SecurityMaster):
+    engine = create_engine("sqlite:///:memory:")
+    schema, metadata = write_sql(sm, engine, MetaData(), "security_master")
+    return read_sql(schema, engine, metadata, "security_master")
+
+
+def parquet_round_trip(sm: SecurityMaster):
+    schema, output_stream = write_parquet(sm, pa.BufferOutputStream())
+    return read_parquet(pa.BufferReader(output_stream.getvalue()), schema)
+
+
+def parquet_dataset_round_trip(sm: SecurityMaster):
+    with TemporaryDirectory() as base_dir:
+        schema, _ = write_parquet_dataset(sm, base_dir)
+        return read_parquet_dataset(base_dir, schema)
+
+
+def csv_round_trip(sm: SecurityMaster):
+    convert_options, output_stream = write_csv(sm, pa.BufferOutputStream())
+    return read_csv(pa.BufferReader(output_stream.getvalue()), convert_options)
+
+
+def run_scale(
+    fact_count: int, security_count: int, seed: int, repeat: int
+) -> dict[str, float | None]:
+    audit_trail = generate_synthetic_audit_trail(fact_count, security_count, seed)
+    update = generate_synthetic_update(max(1, fact_count // 100), security_count, seed)
+    positions = generate_synthetic_positions(
+        min(fact_count, 1_000_000), security_count, seed
+    )
+    sm = generate_security_master(audit_trail, ATTRIBUTE_PRIORITY)
+
+    def filter_all(sm: SecurityMaster):
+        for asset_class in [*ASSET_CLASSES, None]:
+            filter_by_asset_class(sm, asset_class)
+
+    def fresh_sm():
+        sm.invalidate_cache()
+        sm.stats = None
+        return sm
+
+    benchmarks: dict[str, tuple[Callable[[Any], Any], Callable[[], Any]]] = {
+        "generate_security_master": (
+            lambda _: generate_security_master(audit_trail, ATTRIBUTE_PRIORITY),
+            lambda: None,
+        ),
+        "generate_security_master_columnar": (
+            lambda _: generate_security_master(
+                audit_trail, ATTRIBUTE_PRIORITY, "columnar"
+            ),
+            lambda: None,
+        ),
+        "merge_audit_trail_update": (
+            lambda sm: merge_audit_trail_update(sm, update, ATTRIBUTE_PRIORITY),
+            lambda: copy_sm(sm),
+        ),
+        "merge_audit_trail_update_bulk": (
+            lambda sm: merge_audit_trail_update(sm, update, ATTRIBUTE_PRIORITY, True),
+            lambda: copy_sm(sm),
+        ),
+        "join_positions": (lambda sm: join_positions(sm, positions), fresh_sm),
+        "join_positions_bulk": (
+            lambda sm: join_positions_bulk(sm, positions),
+            fresh_sm,
+        ),
+        "filter_by_asset_class": (filter_all, fresh_sm),
+        "io_arrow": (lambda sm: from_arrow(to_arrow(sm)[0]), fresh_sm),
+        "io_pandas": (lambda sm: from_pandas(*to_pandas(sm)), fresh_sm),
+        "io_parquet": (parquet_round_trip, fresh_sm),
+        "io_parquet_dataset": (parquet_dataset_round_trip, fresh_sm),
+        "io_csv": (csv_round_trip, fresh_sm),
+        "io_sql": (sql_round_trip, fresh_sm),
+    }
+    timings: dict[str, float | None] = {}
+
+    for name, (fn, setup) in benchmarks.items():
+        # A benchmark that fails at some scale (e.g. SQLite's bound parameter
+        # limit) is recorded as null so the rest of the suite still runs
+        try:
+            timings[name] = time_call(fn, setup, repeat)
+        except Exception as e:
+            print(f"Benchmark {name} failed: {str(e).splitlines()[0]}", file=sys.stderr)
+            timings[name] = None
+
+    return timings
+
+
+def run_suite(scales: list[str], seed: int = 0, repeat: int = 3) -> dict[str, Any]:
+    return {
+        "metadata": {
+            "python": sys.version,
+            "platform": platform.platform(),
+            "seed": seed,
+            "repeat": repeat,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": {scale: run_scale(*SCALES[scale], seed, repeat) for scale in scales},
+    }
+
+
+def compare_to_baseline(
+    results: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[tuple[str, str, float, float | None]]:
+    regressions = []
+
+    for scale, timings in results["results"].items():
+        baseline_timings = baseline["results"].get(scale, {})
+
+        for benchmark, seconds in timings.items():
+            baseline_seconds = baseline_timings.get(benchmark)
+
+            if baseline_seconds is None:
+                continue
+
+            # A benchmark that used to run but now fails is a regression too
+            if seconds is None or seconds > baseline_seconds * (1 + tolerance):
+                regressions.append((scale, benchmark, baseline_seconds, seconds))
+
+    return regressions
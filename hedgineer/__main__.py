@@ -1,10 +1,16 @@
 import argparse
+import asyncio
 import os
 
 from sqlalchemy import MetaData, create_engine
 
-from .collect import filter_by_asset_class, generate_security_master, join_positions
-from .globals import ATTRIBUTE_PRIORITY, POSITIONS_TABLE
+from .collect import (
+    as_of,
+    filter_by_asset_class,
+    generate_security_master,
+    join_positions,
+)
+from .globals import ATTRIBUTE_PRIORITY, ATTRIBUTE_TYPES, POSITIONS_TABLE
 from .io import (
     format_jp,
     format_sm,
@@ -14,6 +20,9 @@ from .io import (
     write_sql,
 )
 from .merge import merge_audit_trail_update
+from .service import MergeService, serve
+from .types import BatchMetrics
+from .utils import parse_date
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="...")
@@ -22,6 +31,14 @@ if __name__ == "__main__":
     parser.add_argument("-f", "--filter", type=str)
     parser.add_argument("-p", "--positions", action="store_true")
     parser.add_argument("-s", "--sql", action="store_true")
+    parser.add_argument(
+        "-e", "--engine", choices=["python", "columnar"], default="python"
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("-a", "--as-of", type=str)
+    parser.add_argument("-w", "--watch", nargs="+", type=str)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--batch-delay", type=float, default=1.0)
     args = parser.parse_args()
 
     FILE_PATH = os.path.dirname(os.path.abspath(__file__))
@@ -33,22 +50,55 @@ if __name__ == "__main__":
         else:
             generate_audit_trail(os.path.join(DATA_PATH, "audit_trail_generated.csv"))
             audit_trail = read_audit_trail(
-                os.path.join(DATA_PATH, "audit_trail_generated.csv")
+                os.path.join(DATA_PATH, "audit_trail_generated.csv"), ATTRIBUTE_TYPES
+            )
+            sm = generate_security_master(
+                audit_trail, ATTRIBUTE_PRIORITY, args.engine, args.jobs
             )
-            sm = generate_security_master(audit_trail, ATTRIBUTE_PRIORITY)
             print(format_sm(sm, "Security Master (Generated)"))
     else:
-        audit_trail = read_audit_trail(os.path.join(DATA_PATH, "audit_trail.csv"))
-        sm = generate_security_master(audit_trail, ATTRIBUTE_PRIORITY)
+        audit_trail = read_audit_trail(
+            os.path.join(DATA_PATH, "audit_trail.csv"), ATTRIBUTE_TYPES
+        )
+        sm = generate_security_master(
+            audit_trail, ATTRIBUTE_PRIORITY, args.engine, args.jobs
+        )
         print(format_sm(sm, "Security Master"))
 
         if args.merge:
             audit_trail_update = read_audit_trail(
-                os.path.join(DATA_PATH, "audit_trail_update.csv")
+                os.path.join(DATA_PATH, "audit_trail_update.csv"), ATTRIBUTE_TYPES
+            )
+            sm = merge_audit_trail_update(
+                sm, audit_trail_update, ATTRIBUTE_PRIORITY, jobs=args.jobs
             )
-            sm = merge_audit_trail_update(sm, audit_trail_update, ATTRIBUTE_PRIORITY)
             print(format_sm(sm, "Security Master after Merge"))
 
+        if args.watch:
+
+            def print_batch(_, metrics: BatchMetrics):
+                print(
+                    f"Merged {metrics.fact_count} facts for "
+                    f"{metrics.security_count} securities in "
+                    f"{metrics.merge_duration:.3f}s "
+                    f"(latency {metrics.latency:.3f}s, "
+                    f"{metrics.queued_facts} facts queued)"
+                )
+
+            service = MergeService(
+                sm,
+                ATTRIBUTE_PRIORITY,
+                args.batch_size,
+                args.batch_delay,
+                on_batch=print_batch,
+            )
+
+            try:
+                asyncio.run(serve(service, args.watch, attribute_types=ATTRIBUTE_TYPES))
+            except KeyboardInterrupt:
+                sm = service.sm
+                print(format_sm(sm, "Security Master after Watch"))
+
     if args.filter:
         if args.filter.strip().lower() == "none":
             sm = filter_by_asset_class(sm, None)
@@ -57,6 +107,10 @@ if __name__ == "__main__":
             sm = filter_by_asset_class(sm, args.filter)
             print(format_sm(sm, f"Security Master (asset_class: {args.filter})"))
 
+    if args.as_of:
+        sm = as_of(sm, parse_date(args.as_of))
+        print(format_sm(sm, f"Security Master (as of: {args.as_of})"))
+
     if args.positions:
         jp = join_positions(sm, POSITIONS_TABLE)
         print(format_jp(jp, "Consolidated Position Information"))
@@ -65,5 +119,7 @@ if __name__ == "__main__":
         engine = create_engine("sqlite:///:memory:", echo=True)
         metadata = MetaData()
 
-        schema, metadata = write_sql(sm, engine, metadata, "security_master")
+        schema, metadata = write_sql(
+            sm, engine, metadata, "security_master", ATTRIBUTE_TYPES
+        )
         sm = read_sql(schema, engine, metadata, "security_master")
@@ -0,0 +1,239 @@
+from collections.abc import MutableSequence
+from datetime import date
+from typing import Callable, Iterable
+
+import numpy as np
+import pyarrow as pa  # type: ignore
+import pyarrow.compute as pc  # type: ignore
+
+from .types import Header, SecurityMaster, SMData
+from .utils import rows_equal
+
+
+class ArrowRows(MutableSequence):
+    # Rows read straight from an Arrow table, nothing is converted to Python
+    # until it is read. Single rows are read value by value, iteration converts
+    # one record batch at a time and slices share the table's buffers. The
+    # table is never modified, merges build a new one, so rows can stand in for
+    # any other master's rows but writes to them raise
+    def __init__(self, table: pa.Table):
+        self.table = table
+        self._security_ids: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+
+            return ArrowRows(self.table.slice(start, max(0, stop - start)))
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("ArrowRows index out of range")
+
+        return tuple(column[i].as_py() for column in self.table.columns)
+
+    def __setitem__(self, i, row):
+        raise Exception("ArrowRows are read-only, merges build a new table")
+
+    def __delitem__(self, i):
+        raise Exception("ArrowRows are read-only, merges build a new table")
+
+    def insert(self, i: int, row: tuple):
+        raise Exception("ArrowRows are read-only, merges build a new table")
+
+    def __iter__(self):
+        for batch in self.table.to_batches():
+            yield from zip(*(column.to_pylist() for column in batch.columns))
+
+    def __eq__(self, other):
+        if not isinstance(other, MutableSequence):
+            return NotImplemented
+
+        return rows_equal(self, other)
+
+    def __repr__(self):
+        return f"ArrowRows({list(self)!r})"
+
+    def copy(self) -> "ArrowRows":
+        return ArrowRows(self.table)
+
+    def columns(self) -> list[list]:
+        if len(self) == 0:
+            return []
+
+        return [column.to_pylist() for column in self.table.columns]
+
+    def select(self, header: Header) -> "ArrowRows":
+        # Columns the table doesn't have start out null, they take a type once
+        # values are merged into them
+        return ArrowRows(
+            pa.table(
+                [
+                    (
+                        self.table[column]
+                        if column in self.table.column_names
+                        else pa.nulls(len(self))
+                    )
+                    for column in header
+                ],
+                names=header,
+            )
+        )
+
+    def filter(self, mask: pa.ChunkedArray) -> "ArrowRows":
+        return ArrowRows(self.table.filter(mask))
+
+    def security_ids(self) -> np.ndarray:
+        if self._security_ids is None:
+            self._security_ids = self.table["security_id"].to_numpy()
+
+        return self._security_ids
+
+    def find_run(self, security_id: int) -> tuple[int, int]:
+        security_ids = self.security_ids()
+        return (
+            int(np.searchsorted(security_ids, security_id, "left")),
+            int(np.searchsorted(security_ids, security_id, "right")),
+        )
+
+    def splice(
+        self,
+        security_ids: Iterable[int],
+        rebuild_run: Callable[[int, SMData], SMData],
+    ) -> "ArrowRows":
+        # Only the runs of the given securities, in increasing order, are
+        # converted to Python, all in one go, and rebuilt. The rebuilt rows are
+        # put in place with a single take, every other row stays in Arrow
+        security_ids = list(security_ids)
+        starts = np.searchsorted(self.security_ids(), security_ids, "left")
+        ends = np.searchsorted(self.security_ids(), security_ids, "right")
+
+        is_kept = np.ones(len(self), dtype=bool)
+        for start, end in zip(starts, ends):
+            is_kept[start:end] = False
+
+        run_rows = list(ArrowRows(self.table.take(np.flatnonzero(~is_kept))))
+        rebuilt_rows: SMData = []
+        offset = 0
+
+        for security_id, run_length in zip(security_ids, ends - starts):
+            security_rows = run_rows[offset : offset + run_length]
+            rebuilt_rows.extend(rebuild_run(security_id, security_rows))
+            offset += run_length
+
+        rebuilt_table = rows_to_table(rebuilt_rows, self.table.column_names)
+        table = pa.concat_tables(unify_column_types(self.table, rebuilt_table))
+
+        kept = np.flatnonzero(is_kept)
+        rebuilt_ids = rebuilt_table["security_id"].to_numpy()
+        rebuilt_positions = np.searchsorted(
+            self.security_ids()[kept], rebuilt_ids, "left"
+        ) + np.arange(len(rebuilt_ids))
+
+        order = np.empty(len(kept) + len(rebuilt_ids), dtype=np.int64)
+        is_rebuilt = np.zeros(len(order), dtype=bool)
+        is_rebuilt[rebuilt_positions] = True
+        order[rebuilt_positions] = len(self) + np.arange(len(rebuilt_ids))
+        order[~is_rebuilt] = kept
+
+        return ArrowRows(table.take(order))
+
+
+def rows_to_table(rows: SMData, header: Header) -> pa.Table:
+    # Each column's type is inferred from its own values. Converting them to an
+    # existing column's type instead would silently truncate floats into ints
+    columns = list(zip(*rows)) if len(rows) > 0 else [() for _ in header]
+    arrays = []
+
+    for column, values in zip(header, columns):
+        try:
+            arrays.append(pa.array(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            raise Exception(f"Column {column} holds values of more than one type")
+
+    return pa.table(arrays, names=header)
+
+
+def unify_column_types(*tables: pa.Table) -> list[pa.Table]:
+    # Columns that only hold nulls in one table take their type from another,
+    # ints are promoted to floats and strings to large strings where needed
+    types: dict[str, pa.DataType] = {}
+    for table in tables:
+        for field in table.schema:
+            data_type = types.get(field.name, pa.null())
+            try:
+                unified_schema = pa.unify_schemas(
+                    [pa.schema([(field.name, data_type)]), pa.schema([field])],
+                    promote_options="permissive",
+                )
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                raise Exception(
+                    f"Column {field.name} holds values of more than one type "
+                    f"({data_type} and {field.type})"
+                )
+
+            types[field.name] = unified_schema.field(0).type
+
+    schema = pa.schema(list(types.items()))
+    return [table.cast(schema) for table in tables]
+
+
+def filter_by_asset_class_arrow(
+    sm: SecurityMaster, asset_class: str | None
+) -> SecurityMaster:
+    if not isinstance(sm.data, ArrowRows):
+        raise Exception("Security master rows are not backed by Arrow")
+
+    # A column that only holds nulls has no type of its own, hence the casts
+    asset_classes = sm.data.table["asset_class"].cast(pa.string())
+    mask = (
+        pc.is_null(asset_classes)
+        if asset_class is None
+        else pc.fill_null(pc.equal(asset_classes, asset_class), False)
+    )
+    filtered_rows = sm.data.filter(mask)
+
+    if len(filtered_rows) == 0:
+        return SecurityMaster.from_tuple(
+            (list(sm.header), [], dict(sm.col_index)), validate=False
+        )
+
+    # As with the partition index, columns without a value are dropped
+    non_empty_columns = [
+        column
+        for column in sm.header
+        if filtered_rows.table[column].null_count < len(filtered_rows)
+    ]
+    new_col_index = {v: i for i, v in enumerate(non_empty_columns)}
+
+    return SecurityMaster.from_tuple(
+        (
+            non_empty_columns,
+            ArrowRows(filtered_rows.table.select(non_empty_columns)),
+            new_col_index,
+        ),
+        validate=False,
+    )
+
+
+def as_of_arrow(sm: SecurityMaster, d: date) -> SecurityMaster:
+    if not isinstance(sm.data, ArrowRows):
+        raise Exception("Security master rows are not backed by Arrow")
+
+    table = sm.data.table
+    mask = pc.and_(
+        pc.less_equal(table["effective_start_date"], d),
+        pc.fill_null(
+            pc.greater(table["effective_end_date"].cast(pa.date32()), d), True
+        ),
+    )
+
+    return SecurityMaster.from_tuple(
+        (list(sm.header), sm.data.filter(mask), dict(sm.col_index)), validate=False
+    )
@@ -1,12 +1,35 @@
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
 from functools import reduce
+from heapq import merge
+from itertools import repeat
+from multiprocessing import get_context
 from operator import itemgetter
+from typing import Iterable
 
+import numpy as np
+
+from .arrow import ArrowRows, as_of_arrow, filter_by_asset_class_arrow
+from .columnar import (
+    asof_match,
+    generate_data_columnar,
+    to_object_array,
+    to_ordinals,
+)
+from .index import (
+    find_row,
+    get_interval_index,
+    get_partition_index,
+    get_snapshots,
+)
+from .sparse import SparseRows, to_columns
+from .stats import get_empty_columns, project_column_stats
 from .types import (
     AttributePair,
     AuditFact,
     AuditTrail,
     ColumnIndex,
+    FactLog,
     FlatFactSet,
     Header,
     JoinedPositions,
@@ -16,14 +39,14 @@ from .types import (
 from .utils import deeply_spread, generate_none_tuple
 
 
-def extract_header(
-    audit_trail: AuditTrail, attribute_priority: dict[str, int]
+def extract_header_from_attributes(
+    attributes: Iterable[str], attribute_priority: dict[str, int]
 ) -> tuple[Header, ColumnIndex]:
     header = [
         "security_id",
         "effective_start_date",
         "effective_end_date",
-        *list(dict.fromkeys(map(lambda raw_fact: raw_fact[1], audit_trail)).keys()),
+        *list(dict.fromkeys(attributes).keys()),
     ]
     header = sorted(header, key=lambda x: (attribute_priority.get(x, float("inf")), x))
     col_index = {v: i for i, v in enumerate(header)}
@@ -31,6 +54,14 @@ def extract_header(
     return header, col_index
 
 
+def extract_header(
+    audit_trail: AuditTrail, attribute_priority: dict[str, int]
+) -> tuple[Header, ColumnIndex]:
+    return extract_header_from_attributes(
+        map(lambda raw_fact: raw_fact[1], audit_trail), attribute_priority
+    )
+
+
 def bucket_fact(bucket: dict[int, dict[date, list[AttributePair]]], fact: AuditFact):
     security_id, attribute_key, value, effective_date = fact
     bucket.setdefault(security_id, {effective_date: []}).setdefault(
@@ -95,7 +126,7 @@ def accumulate_fact(
 
 
 def generate_data_from_facts(
-    sorted_flat_facts: list[FlatFactSet],
+    sorted_flat_facts: Iterable[FlatFactSet],
     col_index: ColumnIndex,
 ) -> SMData:
     sm_data: list[tuple]  # Solely for mypy
@@ -104,61 +135,148 @@ def generate_data_from_facts(
     return sm_data
 
 
+def generate_data_from_audit_trail(
+    audit_trail: AuditTrail, col_index: ColumnIndex, engine: str = "python"
+) -> SMData:
+    if engine == "python":
+        sorted_flat_facts = generate_sorted_flat_facts(audit_trail)
+        return generate_data_from_facts(sorted_flat_facts, col_index)
+    elif engine == "columnar":
+        return generate_data_columnar(audit_trail, col_index)
+
+    raise Exception(f"Unknown build engine: {engine}")
+
+
+def partition_audit_trail(audit_trail: AuditTrail, partitions: int) -> list[AuditTrail]:
+    partitioned_audit_trail: list[AuditTrail] = [[] for _ in range(partitions)]
+
+    for fact in audit_trail:
+        partitioned_audit_trail[hash(fact[0]) % partitions].append(fact)
+
+    return partitioned_audit_trail
+
+
+def generate_data_in_parallel(
+    audit_trail: AuditTrail, col_index: ColumnIndex, engine: str, jobs: int
+) -> SMData:
+    # Each security's history only depends on its own facts, so every partition
+    # can be built independently and holds complete row runs for its securities
+    partitions = list(filter(len, partition_audit_trail(audit_trail, jobs)))
+
+    # Workers are spawned rather than forked, forking a process that has already
+    # started Arrow/NumPy threads can deadlock, and spawn is all Windows offers
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=get_context("spawn")
+    ) as executor:
+        partitioned_data = list(
+            executor.map(
+                generate_data_from_audit_trail,
+                partitions,
+                repeat(col_index),
+                repeat(engine),
+            )
+        )
+
+    return list(merge(*partitioned_data, key=itemgetter(col_index["security_id"])))
+
+
+def build_fact_log(audit_trail: AuditTrail) -> FactLog:
+    fact_log: FactLog = {}
+
+    for fact in audit_trail:
+        fact_log.setdefault(fact[0], []).append(fact)
+
+    return fact_log
+
+
 def generate_security_master(
-    audit_trail: AuditTrail, attribute_priority: dict[str, int]
+    audit_trail: AuditTrail,
+    attribute_priority: dict[str, int],
+    engine: str = "python",
+    jobs: int = 1,
+    retain_facts: bool = False,
+    sparse: bool = False,
 ) -> SecurityMaster:
     header, col_index = extract_header(audit_trail, attribute_priority)
-    sorted_flat_facts = generate_sorted_flat_facts(audit_trail)
-    data = generate_data_from_facts(sorted_flat_facts, col_index)
 
-    return SecurityMaster.from_tuple((header, data, col_index))
+    if jobs > 1:
+        data = generate_data_in_parallel(audit_trail, col_index, engine, jobs)
+    else:
+        data = generate_data_from_audit_trail(audit_trail, col_index, engine)
+
+    if sparse:
+        data = SparseRows(data, len(header))
+
+    sm = SecurityMaster.from_tuple((header, data, col_index), validate=False)
+
+    if retain_facts:
+        sm.facts = build_fact_log(audit_trail)
+
+    return sm
 
 
 def remove_empty_columns(sm: SecurityMaster) -> SecurityMaster:
     if len(sm.data) == 0:
         return sm
 
-    column_empty_map = list(
-        map(lambda col: all(val is None for val in col), zip(*sm.data))
-    )
+    empty_columns = set(get_empty_columns(sm))
+    column_empty_map = [column in empty_columns for column in sm.header]
     new_header = [v for i, v in enumerate(sm.header) if not column_empty_map[i]]
     new_col_index = {v: i for i, v in enumerate(new_header)}
     new_data = [
         tuple(v for i, v in enumerate(t) if not column_empty_map[i]) for t in sm.data
     ]
 
-    return SecurityMaster.from_tuple((new_header, new_data, new_col_index))
+    new_sm = SecurityMaster.from_tuple(
+        (new_header, new_data, new_col_index), validate=False
+    )
+    new_sm.stats = project_column_stats(sm.stats, new_header, len(new_data))
+
+    return new_sm
 
 
 def filter_by_asset_class(sm: SecurityMaster, asset_class: str | None):
-    filtered_sm = SecurityMaster.from_tuple(
-        (
-            sm.header,
-            list(
-                filter(lambda x: x[sm.col_index["asset_class"]] == asset_class, sm.data)
-            ),
-            sm.col_index,
+    if isinstance(sm.data, ArrowRows):
+        return filter_by_asset_class_arrow(sm, asset_class)
+
+    partition_index = get_partition_index(sm, "asset_class")
+
+    if asset_class not in partition_index:
+        return SecurityMaster.from_tuple(
+            (list(sm.header), [], dict(sm.col_index)), validate=False
         )
+
+    positions, non_empty_columns = partition_index[asset_class]
+    kept_indices = [sm.col_index[column] for column in non_empty_columns]
+    new_col_index = {v: i for i, v in enumerate(non_empty_columns)}
+    new_data = [tuple(sm.data[p][i] for i in kept_indices) for p in positions]
+
+    return SecurityMaster.from_tuple(
+        (list(non_empty_columns), new_data, new_col_index), validate=False
     )
-    return remove_empty_columns(filtered_sm)
+
+
+def as_of_many(sm: SecurityMaster, dates: list[date]) -> dict[date, SecurityMaster]:
+    if isinstance(sm.data, ArrowRows):
+        return {d: as_of_arrow(sm, d) for d in dates}
+
+    return {
+        d: SecurityMaster.from_tuple(
+            (list(sm.header), list(snapshot), dict(sm.col_index)), validate=False
+        )
+        for d, snapshot in get_snapshots(sm, dates).items()
+    }
+
+
+def as_of(sm: SecurityMaster, d: date) -> SecurityMaster:
+    return as_of_many(sm, [d])[d]
 
 
 def join_position(sm: SecurityMaster, attributes: list[str], position: tuple) -> tuple:
     security_id, quantity, date = position
+    master_row = find_row(sm, get_interval_index(sm), security_id, date)
 
-    try:
-        master_row = next(
-            filter(
-                lambda x: x[sm.col_index["security_id"]] == security_id
-                and x[sm.col_index["effective_start_date"]] <= date
-                and (
-                    x[sm.col_index["effective_end_date"]] is None
-                    or x[sm.col_index["effective_end_date"]] > date
-                ),
-                sm.data,
-            )
-        )
-    except StopIteration:
+    if master_row is None:
         return tuple([])
 
     return tuple(
@@ -171,12 +289,16 @@ def join_position(sm: SecurityMaster, attributes: list[str], position: tuple) ->
     )
 
 
-def join_positions(sm: SecurityMaster, positions_table: list[tuple]) -> JoinedPositions:
-    attributes = [
+def get_position_attributes(sm: SecurityMaster) -> list[str]:
+    return [
         attr
         for attr in sm.header
         if attr not in ["security_id", "effective_start_date", "effective_end_date"]
     ]
+
+
+def join_positions(sm: SecurityMaster, positions_table: list[tuple]) -> JoinedPositions:
+    attributes = get_position_attributes(sm)
     header = ["security_id", "quantity", "date", *attributes]
     joined_positions = list(
         filter(
@@ -185,4 +307,43 @@ def join_positions(sm: SecurityMaster, positions_table: list[tuple]) -> JoinedPo
         )
     )
 
-    return JoinedPositions.from_tuple((header, joined_positions))
+    return JoinedPositions.from_tuple((header, joined_positions), validate=False)
+
+
+def join_positions_bulk(
+    sm: SecurityMaster, positions_table: list[tuple]
+) -> JoinedPositions:
+    attributes = get_position_attributes(sm)
+    header = ["security_id", "quantity", "date", *attributes]
+
+    if len(positions_table) == 0 or len(sm.data) == 0:
+        return JoinedPositions.from_tuple((header, []), validate=False)
+
+    master_columns = to_columns(sm.data)
+    security_ids, quantities, dates = map(to_object_array, zip(*positions_table))
+
+    matches = asof_match(
+        np.array(master_columns[sm.col_index["security_id"]], dtype=np.int64),
+        to_ordinals(master_columns[sm.col_index["effective_start_date"]]),
+        to_ordinals(master_columns[sm.col_index["effective_end_date"]]),
+        security_ids.astype(np.int64),
+        to_ordinals(dates),
+    )
+
+    # Positions without a matching master row are dropped, as in join_positions
+    is_match = matches >= 0
+    matched_rows = matches[is_match]
+    joined_columns = [
+        security_ids[is_match],
+        quantities[is_match],
+        dates[is_match],
+        *(
+            to_object_array(master_columns[sm.col_index[attr]])[matched_rows]
+            for attr in attributes
+        ),
+    ]
+
+    return JoinedPositions.from_tuple(
+        (header, list(zip(*(column.tolist() for column in joined_columns)))),
+        validate=False,
+    )
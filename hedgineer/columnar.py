@@ -0,0 +1,156 @@
+from datetime import date
+
+import numpy as np
+
+from .types import AuditTrail, ColumnIndex, SMData
+
+
+def to_object_array(values) -> np.ndarray:
+    # Assigning into an empty array stops NumPy from treating tuple or list
+    # values as extra dimensions
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def sort_facts_columnar(audit_trail: AuditTrail):
+    security_ids, attributes, values, dates = zip(*audit_trail)
+    fact_count = len(audit_trail)
+
+    sid = np.fromiter(security_ids, dtype=np.int64, count=fact_count)
+    ordinals = np.fromiter(map(date.toordinal, dates), dtype=np.int64, count=fact_count)
+
+    # lexsort is stable, so facts sharing (security_id, effective_date) keep
+    # their audit trail order and the last one received wins, as in diff_row
+    order = np.lexsort((ordinals, sid))
+
+    return (
+        sid[order],
+        ordinals[order],
+        to_object_array(attributes)[order],
+        to_object_array(values)[order],
+        to_object_array(dates)[order],
+    )
+
+
+def group_rows(sid: np.ndarray, ordinals: np.ndarray):
+    # A new row starts whenever (security_id, effective_date) changes
+    row_boundary = np.empty(len(sid), dtype=bool)
+    row_boundary[0] = True
+    row_boundary[1:] = (sid[1:] != sid[:-1]) | (ordinals[1:] != ordinals[:-1])
+
+    row_of_fact = np.cumsum(row_boundary) - 1
+    row_starts = np.flatnonzero(row_boundary)
+
+    row_sid = sid[row_starts]
+    is_new_security = np.empty(len(row_starts), dtype=bool)
+    is_new_security[0] = True
+    is_new_security[1:] = row_sid[1:] != row_sid[:-1]
+
+    return row_of_fact, row_starts, is_new_security
+
+
+def forward_fill_column(
+    fact_rows: np.ndarray,
+    fact_values: np.ndarray,
+    is_new_security: np.ndarray,
+) -> np.ndarray:
+    row_count = len(is_new_security)
+    positions = np.arange(row_count)
+
+    # fact_rows is sorted, keep only the last fact for each row
+    keep = np.ones(len(fact_rows), dtype=bool)
+    keep[:-1] = fact_rows[1:] != fact_rows[:-1]
+
+    column = np.full(row_count, None, dtype=object)
+    column[fact_rows[keep]] = fact_values[keep]
+
+    has_value = np.zeros(row_count, dtype=bool)
+    has_value[fact_rows[keep]] = True
+
+    # Every row points at the most recent row that set a value, but never
+    # past the first row of its security, which resets the fill to None
+    source = np.where(has_value | is_new_security, positions, 0)
+    np.maximum.accumulate(source, out=source)
+
+    return column[source]
+
+
+def generate_data_columnar(audit_trail: AuditTrail, col_index: ColumnIndex) -> SMData:
+    if len(audit_trail) == 0:
+        return []
+
+    sid, ordinals, attributes, values, dates = sort_facts_columnar(audit_trail)
+    row_of_fact, row_starts, is_new_security = group_rows(sid, ordinals)
+    row_count = len(row_starts)
+
+    columns: list = [np.full(row_count, None, dtype=object)] * len(col_index)
+    columns[col_index["security_id"]] = sid[row_starts]
+    columns[col_index["effective_start_date"]] = dates[row_starts]
+
+    # A row ends where the next row of the same security begins
+    end_dates = np.full(row_count, None, dtype=object)
+    continues = ~is_new_security[1:]
+    end_dates[:-1][continues] = columns[col_index["effective_start_date"]][1:][
+        continues
+    ]
+    columns[col_index["effective_end_date"]] = end_dates
+
+    for attribute in np.unique(attributes):
+        mask = attributes == attribute
+        columns[col_index[attribute]] = forward_fill_column(
+            row_of_fact[mask], values[mask], is_new_security
+        )
+
+    return list(zip(*(column.tolist() for column in columns)))
+
+
+def to_ordinals(dates) -> np.ndarray:
+    # Open-ended rows (a None end date) compare greater than any real date
+    return np.fromiter(
+        (np.iinfo(np.int64).max if d is None else d.toordinal() for d in dates),
+        dtype=np.int64,
+    )
+
+
+def asof_match(
+    master_sids: np.ndarray,
+    master_starts: np.ndarray,
+    master_ends: np.ndarray,
+    position_sids: np.ndarray,
+    position_dates: np.ndarray,
+) -> np.ndarray:
+    master_count, position_count = len(master_sids), len(position_sids)
+
+    if master_count == 0:
+        return np.full(position_count, -1, dtype=np.int64)
+
+    master_order = np.lexsort((master_starts, master_sids))
+
+    # Sweep master intervals and positions together, master rows sort before
+    # positions on the same (security_id, date) so a row starting that day matches
+    sids = np.concatenate((master_sids[master_order], position_sids))
+    dates = np.concatenate((master_starts[master_order], position_dates))
+    is_position = np.concatenate(
+        (np.zeros(master_count, dtype=bool), np.ones(position_count, dtype=bool))
+    )
+    sweep = np.lexsort((is_position, dates, sids))
+
+    # Carry the latest master row seen forward onto every position in the sweep
+    latest = np.where(is_position[sweep], -1, sweep)
+    np.maximum.accumulate(latest, out=latest)
+
+    candidates = np.empty(position_count, dtype=np.int64)
+    positions_in_sweep = is_position[sweep]
+    candidates[sweep[positions_in_sweep] - master_count] = latest[positions_in_sweep]
+
+    # A candidate matches if it belongs to the same security and hasn't ended yet
+    has_candidate = candidates >= 0
+    matched_rows = master_order[np.where(has_candidate, candidates, 0)]
+    is_match = (
+        has_candidate
+        & (master_sids[matched_rows] == position_sids)
+        & (master_ends[matched_rows] > position_dates)
+    )
+
+    return np.where(is_match, matched_rows, -1)
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import date, datetime
 from random import choice, randint
 
 # Avoid circular import
@@ -13,6 +13,22 @@ ATTRIBUTE_PRIORITY = {
     "name": 5,
 }
 
+# Values read from files are coerced to these types, and exports use them as
+# column types. Attributes not declared here are kept as strings
+ATTRIBUTE_TYPES: dict[str, type] = {
+    "security_id": int,
+    "effective_start_date": date,
+    "effective_end_date": date,
+    "asset_class": str,
+    "ticker": str,
+    "name": str,
+    "gics_sector": str,
+    "gics_industry": str,
+    "credit_rating": str,
+    "market_cap": int,
+    "interest_rate": int,
+}
+
 TEST_AUDIT_TRAIL: list[tuple] = [
     (1, "ticker", "LENZ", parse_date("03/22/24")),
     (2, "market_cap", 549000, parse_date("05/23/24")),
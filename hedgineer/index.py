@@ -0,0 +1,96 @@
+from bisect import bisect_right
+from datetime import date
+from typing import Any
+
+from .types import IntervalIndex, PartitionIndex, SecurityMaster, SMData
+
+
+def build_interval_index(sm: SecurityMaster) -> IntervalIndex:
+    security_id_index = sm.col_index["security_id"]
+    start_date_index = sm.col_index["effective_start_date"]
+    index: IntervalIndex = {}
+
+    # Rows are kept sorted by (security_id, effective_start_date), so appending
+    # leaves every security's start dates sorted and ready for bisect
+    for row in sm.data:
+        start_dates, rows = index.setdefault(row[security_id_index], ([], []))
+        start_dates.append(row[start_date_index])
+        rows.append(row)
+
+    return index
+
+
+def get_interval_index(sm: SecurityMaster) -> IntervalIndex:
+    return sm.cached("interval_index", build_interval_index)
+
+
+def find_row(
+    sm: SecurityMaster, index: IntervalIndex, security_id: int, d: date
+) -> tuple | None:
+    start_dates, rows = index.get(security_id, ([], []))
+    i = bisect_right(start_dates, d) - 1
+
+    if i < 0:
+        return None
+
+    row = rows[i]
+    end_date = row[sm.col_index["effective_end_date"]]
+
+    return row if end_date is None or end_date > d else None
+
+
+def snapshot_key(d: date) -> str:
+    return f"snapshot:{d.isoformat()}"
+
+
+def build_snapshots(sm: SecurityMaster, dates: list[date]) -> dict[date, SMData]:
+    index = get_interval_index(sm)
+    snapshots: dict[date, SMData] = {d: [] for d in dates}
+
+    # One pass over the securities answers every requested date
+    for security_id in index:
+        for d in dates:
+            row = find_row(sm, index, security_id, d)
+
+            if row is not None:
+                snapshots[d].append(row)
+
+    return snapshots
+
+
+def get_snapshots(sm: SecurityMaster, dates: list[date]) -> dict[date, SMData]:
+    missing_dates = [
+        d for d in dict.fromkeys(dates) if not sm.is_cached(snapshot_key(d))
+    ]
+    snapshots = build_snapshots(sm, missing_dates)
+
+    return {d: sm.cached(snapshot_key(d), lambda _: snapshots[d]) for d in dates}
+
+
+def build_partition_index(sm: SecurityMaster, column: str) -> PartitionIndex:
+    column_index = sm.col_index[column]
+    positions: dict[Any, list[int]] = {}
+
+    for i, row in enumerate(sm.data):
+        positions.setdefault(row[column_index], []).append(i)
+
+    # Precompute which columns hold any value within each partition
+    index: PartitionIndex = {}
+    for value, rows in positions.items():
+        columns = zip(*(sm.data[i] for i in rows))
+        index[value] = (
+            rows,
+            [
+                column_name
+                for column_name, values in zip(sm.header, columns)
+                if any(v is not None for v in values)
+            ],
+        )
+
+    return index
+
+
+def get_partition_index(sm: SecurityMaster, column: str) -> PartitionIndex:
+    return sm.cached(
+        f"partition:{column}", lambda sm: build_partition_index(sm, column)
+    )
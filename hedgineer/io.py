@@ -1,14 +1,54 @@
 import csv as pycsv
+import operator
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from functools import reduce
 from random import randint
+from tempfile import mkdtemp
+from typing import Iterable, Iterator
+from urllib.parse import quote
 
+import numpy as np
 import pyarrow as pa  # type: ignore
+import pyarrow.compute as pc  # type: ignore
 import pyarrow.csv as csv  # type: ignore
+import pyarrow.dataset as ds  # type: ignore
 import pyarrow.parquet as pq  # type: ignore
-from sqlalchemy import Column, Date, Float, Integer, String, Table, insert, select
+from sqlalchemy import (
+    Column,
+    Date,
+    Float,
+    Integer,
+    String,
+    Table,
+    insert,
+    inspect,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import Insert as PostgreSQLInsert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import Insert as SQLiteInsert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.schema import CreateTable
 
-from .types import AuditTrail, JoinedPositions, SecurityMaster
+from .arrow import ArrowRows
+from .columnar import to_object_array
+from .sparse import to_columns
+from .stats import compute_column_stats, get_column_stats, get_column_type
+from .types import (
+    AuditFact,
+    AuditTrail,
+    ChangeSet,
+    ColumnStats,
+    JoinedPositions,
+    MasterQuery,
+    SecurityMaster,
+    SMData,
+)
 from .utils import format_date, parse_date, random_attribute_pair, random_day
 
 
@@ -29,24 +69,225 @@ def generate_audit_trail(path) -> None:
         writer.writerows(data)
 
 
-def read_audit_trail(path) -> AuditTrail:
-    audit_trail = []
+def coerce_value(value: str, value_type: type):
+    if value_type is str:
+        return value
 
+    value = value.strip()
+    return parse_date(value) if value_type is date else value_type(value)
+
+
+def parse_audit_trail_lines(
+    lines: Iterable[str], attribute_types: dict[str, type] | None = None
+) -> Iterator[AuditFact]:
+    csv_reader = pycsv.reader(
+        lines,
+        quotechar='"',
+        delimiter=",",
+        quoting=pycsv.QUOTE_ALL,
+        skipinitialspace=True,
+    )
+
+    attribute_types = attribute_types or {}
+
+    for row in csv_reader:
+        value = coerce_value(row[2], attribute_types.get(row[1], str))
+        yield (int(row[0]), row[1], value, parse_date(row[3]))
+
+
+def iter_audit_trail(
+    path, attribute_types: dict[str, type] | None = None
+) -> Iterator[AuditFact]:
     with open(path, mode="r", newline="\n") as f:
-        csv_reader = pycsv.reader(
-            f,
-            quotechar='"',
-            delimiter=",",
-            quoting=pycsv.QUOTE_ALL,
-            skipinitialspace=True,
-        )
+        yield from parse_audit_trail_lines(f, attribute_types)
 
-        for row in csv_reader:
-            audit_trail.append(row)
 
-    return [
-        tuple([int(row[0]), row[1], row[2], parse_date(row[3])]) for row in audit_trail
-    ]
+def read_audit_trail(
+    path, attribute_types: dict[str, type] | None = None
+) -> AuditTrail:
+    return list(iter_audit_trail(path, attribute_types))
+
+
+AUDIT_TRAIL_COLUMNS = ["security_id", "attribute", "value", "effective_date"]
+
+# Fields are separated by ", ", which Arrow would read as a field starting
+# with a space. As with the csv module's skipinitialspace, whitespace after a
+# delimiter is dropped, but only outside quoted values such as
+# "Lenz Therapeutics, Inc" or "Say ""hi"", world"
+DELIMITER_SPACING = re.compile(rb",[ \t]+")
+# Every run of more than one space, or any tab, after a comma starts with one of these
+IRREGULAR_SPACINGS = [b",\t", b",  ", b", \t"]
+
+
+def is_fully_quoted(block: bytes) -> bool:
+    # Every field of every line is quoted and no value holds an escaped quote,
+    # so every quote in the block opens or closes a field
+    line_count = block.count(b"\n") + (not block.endswith(b"\n"))
+    return b'""' not in block and block.count(b'"') == (
+        2 * len(AUDIT_TRAIL_COLUMNS) * line_count
+    )
+
+
+def normalize_audit_trail_block(block: bytes) -> bytes:
+    if is_fully_quoted(block) and not any(
+        spacing in block for spacing in IRREGULAR_SPACINGS
+    ):
+        # Each ", " between two quotes then separates fields, bytes.replace
+        # drops the usual single space several times faster than the split below
+        return block.replace(b'", "', b'","')
+
+    # Splitting on quotes leaves the text outside quoted values at the even
+    # positions, escaped quotes only add empty ones. That text holds no quote
+    # so it is joined on one, stripped in a single pass and split back
+    parts = block.split(b'"')
+    outside_quotes = b'"'.join(parts[::2])
+    parts[::2] = DELIMITER_SPACING.sub(b",", outside_quotes).split(b'"')
+
+    return b'"'.join(parts)
+
+
+# Child order of the coerced value column, undeclared attributes are strings
+VALUE_TYPES = [str, int, float, date]
+
+
+def cast_values(values: pa.Array, value_type: type) -> pa.Array:
+    if value_type is str:
+        return values
+
+    values = pc.utf8_trim_whitespace(values)
+    if value_type is date:
+        return pc.strptime(values, format="%m/%d/%y", unit="s").cast(pa.date32())
+
+    return values.cast(get_arrow_type(value_type))
+
+
+def coerce_audit_trail_values(
+    table: pa.Table, attribute_types: dict[str, type]
+) -> pa.Table:
+    # Values are cast with one Arrow call per type rather than one Python call
+    # per value, and recombined into a dense union so each fact reads back with
+    # the type of its attribute
+    table = table.combine_chunks()
+    attributes = table["attribute"].combine_chunks().dictionary_encode()
+    values = table["value"].combine_chunks()
+
+    attribute_codes = np.array(
+        [
+            VALUE_TYPES.index(attribute_types.get(attribute, str))
+            for attribute in attributes.dictionary.to_pylist()
+        ],
+        dtype=np.int8,
+    )
+    type_codes = attribute_codes[attributes.indices.to_numpy(zero_copy_only=False)]
+    offsets = np.zeros(len(type_codes), dtype=np.int32)
+    children = []
+
+    for type_code, value_type in enumerate(VALUE_TYPES):
+        is_type = type_codes == type_code
+        offsets[is_type] = np.arange(np.count_nonzero(is_type), dtype=np.int32)
+        children.append(cast_values(values.filter(pa.array(is_type)), value_type))
+
+    coerced_values = pa.UnionArray.from_dense(
+        pa.array(type_codes, pa.int8()),
+        pa.array(offsets),
+        children,
+        [value_type.__name__ for value_type in VALUE_TYPES],
+    )
+
+    return table.set_column(2, "value", coerced_values)
+
+
+def parse_audit_trail_block(
+    block: bytes,
+    use_threads: bool = True,
+    attribute_types: dict[str, type] | None = None,
+) -> pa.Table:
+    table = csv.read_csv(
+        pa.py_buffer(normalize_audit_trail_block(block)),
+        read_options=csv.ReadOptions(
+            column_names=AUDIT_TRAIL_COLUMNS, use_threads=use_threads
+        ),
+        convert_options=csv.ConvertOptions(
+            column_types={
+                "security_id": pa.int64(),
+                "attribute": pa.string(),
+                "value": pa.string(),
+                "effective_date": pa.string(),
+            }
+        ),
+    )
+    effective_dates = pc.strptime(
+        table["effective_date"], format="%m/%d/%y", unit="s"
+    ).cast(pa.date32())
+
+    table = table.set_column(3, "effective_date", effective_dates)
+
+    if attribute_types is None:
+        return table
+
+    return coerce_audit_trail_values(table, attribute_types)
+
+
+def iter_audit_trail_batches(
+    path,
+    block_size: int = 1 << 26,
+    use_threads: bool = True,
+    attribute_types: dict[str, type] | None = None,
+) -> Iterator[pa.RecordBatch]:
+    # Reads the file in blocks cut at a line end, each block is parsed by Arrow
+    # across threads, so memory stays bounded by the block size
+    remainder = b""
+
+    with open(path, mode="rb") as f:
+        while len(block := f.read(block_size)) > 0:
+            block = remainder + block
+            line_end = block.rfind(b"\n") + 1
+            lines, remainder = block[:line_end], block[line_end:]
+
+            if len(lines) > 0:
+                yield from parse_audit_trail_block(
+                    lines, use_threads, attribute_types
+                ).to_batches()
+
+    if len(remainder.strip()) > 0:
+        yield from parse_audit_trail_block(
+            remainder, use_threads, attribute_types
+        ).to_batches()
+
+
+def column_to_pylist(column: pa.Array) -> list:
+    if not pa.types.is_union(column.type):
+        return column.to_pylist()
+
+    # Arrow converts union values one at a time, converting each typed child
+    # in bulk and scattering it into place is several times faster
+    type_codes = column.type_codes.to_numpy()
+    offsets = column.offsets.to_numpy()
+    values = np.empty(len(column), dtype=object)
+
+    for type_code in range(column.type.num_fields):
+        is_type = type_codes == type_code
+        child_values = to_object_array(column.field(type_code).to_pylist())
+        values[is_type] = child_values[offsets[is_type]]
+
+    return values.tolist()
+
+
+def iter_audit_trail_arrow(
+    path,
+    block_size: int = 1 << 26,
+    use_threads: bool = True,
+    attribute_types: dict[str, type] | None = None,
+) -> Iterator[AuditFact]:
+    batches = iter_audit_trail_batches(path, block_size, use_threads, attribute_types)
+    for batch in batches:
+        yield from zip(*map(column_to_pylist, batch.columns))
+
+
+def read_audit_trail_arrow(
+    path, block_size: int = 1 << 26, attribute_types: dict[str, type] | None = None
+) -> AuditTrail:
+    return list(iter_audit_trail_arrow(path, block_size, True, attribute_types))
 
 
 # https://stackoverflow.com/questions/13214809/pretty-print-2d-list
@@ -99,8 +340,10 @@ def parse_data_type(column):
             "Could not parse column for Arrow conversion: more than 1 data type present in column"
         )
 
-    column_type = column_types.pop()
+    return get_arrow_type(column_types.pop())
 
+
+def get_arrow_type(column_type: type):
     if column_type is int:
         return pa.int64()
     elif column_type is float:
@@ -113,30 +356,99 @@ def parse_data_type(column):
     raise Exception("Could not parse column for Arrow conversion: data type not found")
 
 
-def to_arrow(sm: SecurityMaster) -> tuple[pa.Table, pa.Schema]:
-    raw_columns = list(zip(*sm.data))
-    data_types = map(parse_data_type, raw_columns)
-    schema = pa.schema(list(zip(sm.header, data_types)))
+def parse_column_type(column_stats: ColumnStats, column):
+    # Fall back to scanning the column when the statistics don't pin down a
+    # single type, which also reports why the column can't be converted
+    column_type = get_column_type(column_stats)
+    return (
+        parse_data_type(column) if column_type is None else get_arrow_type(column_type)
+    )
+
+
+def get_schema(
+    sm: SecurityMaster, columns: list, attribute_types: dict[str, type] | None = None
+) -> pa.Schema:
+    # Declared attribute types fix a column's type outright. Otherwise column
+    # statistics, kept up to date by merges, are used and the values are only
+    # scanned when the stats can't tell
+    attribute_types = attribute_types or {}
+    is_declared = all(column in attribute_types for column in sm.header)
+    stats = {} if is_declared else get_column_stats(sm)
+
+    return pa.schema(
+        [
+            (
+                column,
+                (
+                    get_arrow_type(attribute_types[column])
+                    if column in attribute_types
+                    else parse_column_type(stats[column], values)
+                ),
+            )
+            for column, values in zip(sm.header, columns)
+        ]
+    )
+
+
+def to_arrow(
+    sm: SecurityMaster, attribute_types: dict[str, type] | None = None
+) -> tuple[pa.Table, pa.Schema]:
+    if isinstance(sm.data, ArrowRows):
+        return arrow_rows_to_arrow(sm.data, attribute_types)
+
+    raw_columns = to_columns(sm.data)
+    schema = get_schema(sm, raw_columns, attribute_types)
 
     return pa.table(raw_columns, schema=schema), schema
 
 
-def to_arrow_with_schema(data: list[tuple], schema):
-    raw_columns = list(zip(*data))
+def to_arrow_with_schema(data: SMData, schema):
+    raw_columns = to_columns(data)
     return pa.table(raw_columns, schema=schema), schema
 
 
-def from_arrow(arrow_table) -> SecurityMaster:
-    py_table = arrow_table.to_pylist()
-    header = tuple(k for k in py_table[0].keys()) if len(py_table) > 0 else tuple()
+def arrow_rows_to_arrow(
+    rows: ArrowRows, attribute_types: dict[str, type] | None = None
+) -> tuple[pa.Table, pa.Schema]:
+    # The table is handed back as is, only declared columns of another type
+    # are cast
+    attribute_types = attribute_types or {}
+    schema = pa.schema(
+        [
+            (
+                field.name,
+                (
+                    get_arrow_type(attribute_types[field.name])
+                    if field.name in attribute_types
+                    else field.type
+                ),
+            )
+            for field in rows.table.schema
+        ]
+    )
+    arrow_table = rows.table if schema == rows.table.schema else rows.table.cast(schema)
+
+    return arrow_table, schema
+
+
+def from_arrow(arrow_table, lazy: bool = False) -> SecurityMaster:
+    # Rows are zipped from whole columns rather than built from a dict per row.
+    # A lazy master keeps the table and converts rows only as they are read.
+    # An empty table still names its columns, e.g. when a query matches nothing
+    header = arrow_table.column_names
     col_index = {v: i for i, v in enumerate(header)}
-    data = [tuple(v for v in row.values()) for row in py_table]
 
-    return SecurityMaster.from_tuple((list(header), data, col_index))
+    if lazy:
+        return SecurityMaster.from_tuple(
+            (header, ArrowRows(arrow_table), col_index), validate=False
+        )
+
+    data = list(zip(*(column.to_pylist() for column in arrow_table.columns)))
+    return SecurityMaster.from_tuple((header, data, col_index))
 
 
-def to_pandas(sm: SecurityMaster):
-    arrow_table, schema = to_arrow(sm)
+def to_pandas(sm: SecurityMaster, attribute_types: dict[str, type] | None = None):
+    arrow_table, schema = to_arrow(sm, attribute_types)
     return arrow_table.to_pandas(), schema
 
 
@@ -145,20 +457,206 @@ def from_pandas(df, schema):
     return from_arrow(arrow_table)
 
 
-def write_parquet(sm, where):
-    arrow_table, schema = to_arrow(sm)
+def write_parquet(sm, where, attribute_types: dict[str, type] | None = None):
+    arrow_table, schema = to_arrow(sm, attribute_types)
     pq.write_table(arrow_table, where)
 
     return schema, where
 
 
-def read_parquet(where, schema):
-    arrow_table = pq.read_table(where, schema=schema)
-    return from_arrow(arrow_table)
+# Hive partition column derived from effective_start_date, it is only stored
+# in the directory names
+START_YEAR_COLUMN = "effective_start_year"
+KEY_COLUMNS = ["security_id", "effective_start_date"]
+
+
+def get_query_filter(query: MasterQuery, partitioned: bool = False):
+    # Parquet skips every row group whose min/max statistics rule the filter
+    # out, and a partitioned dataset skips whole directories
+    conditions = []
+    security_id = ds.field("security_id")
+
+    if query.security_ids is not None:
+        conditions.append(security_id.isin(sorted(query.security_ids)))
+
+    if query.security_id_range is not None:
+        low, high = query.security_id_range
+        conditions.append((security_id >= low) & (security_id <= high))
 
+    if query.effective_from is not None:
+        end_date = ds.field("effective_end_date")
+        conditions.append(end_date.is_null() | (end_date > query.effective_from))
 
-def write_csv(sm, where):
-    arrow_table, schema = to_arrow(sm)
+    if query.effective_to is not None:
+        conditions.append(ds.field("effective_start_date") < query.effective_to)
+
+        if partitioned:
+            conditions.append(ds.field(START_YEAR_COLUMN) <= query.effective_to.year)
+
+    if query.asset_classes is not None:
+        asset_class = ds.field("asset_class")
+        condition = asset_class.isin([v for v in query.asset_classes if v is not None])
+        if None in query.asset_classes:
+            condition = condition | asset_class.is_null()
+
+        conditions.append(condition)
+
+    return reduce(operator.and_, conditions) if len(conditions) > 0 else None
+
+
+def get_query_columns(query: MasterQuery, names: list[str]) -> list[str]:
+    if query.columns is None:
+        return names
+
+    for column in query.columns:
+        if column not in names:
+            raise Exception(f"Column {column} is not in the schema")
+
+    # Key columns are always read so the result is still a security master
+    return [name for name in names if name in KEY_COLUMNS or name in query.columns]
+
+
+def read_parquet(where, schema, lazy: bool = False, query: MasterQuery | None = None):
+    query = query or MasterQuery()
+    arrow_table = pq.read_table(
+        where,
+        schema=schema,
+        columns=get_query_columns(query, schema.names),
+        filters=get_query_filter(query),
+    )
+    return from_arrow(arrow_table, lazy)
+
+
+def get_dataset_partitioning():
+    return ds.partitioning(
+        pa.schema([("asset_class", pa.string()), (START_YEAR_COLUMN, pa.int32())]),
+        flavor="hive",
+    )
+
+
+def to_hive_value(value) -> str:
+    # As written and read back by pyarrow.dataset's hive partitioning
+    return "__HIVE_DEFAULT_PARTITION__" if value is None else quote(str(value), safe="")
+
+
+def split_partitions(arrow_table: pa.Table) -> list[pa.Table]:
+    # A column that only holds nulls has no type of its own, hence the cast
+    asset_class_index = arrow_table.schema.get_field_index("asset_class")
+    arrow_table = arrow_table.set_column(
+        asset_class_index,
+        "asset_class",
+        arrow_table["asset_class"].cast(pa.string()),
+    )
+    start_years = pc.year(arrow_table["effective_start_date"]).cast(pa.int32())
+    arrow_table = arrow_table.append_column(START_YEAR_COLUMN, start_years)
+
+    # Sorting by partition first lays each partition out as one slice, already
+    # sorted by the key columns within it
+    arrow_table = arrow_table.sort_by(
+        [
+            (column, "ascending")
+            for column in ["asset_class", START_YEAR_COLUMN, *KEY_COLUMNS]
+        ]
+    )
+    asset_classes = arrow_table["asset_class"].combine_chunks().dictionary_encode()
+    asset_class_codes = pc.fill_null(asset_classes.indices, -1).to_numpy()
+    years = arrow_table[START_YEAR_COLUMN].to_numpy()
+
+    is_boundary = (asset_class_codes[1:] != asset_class_codes[:-1]) | (
+        years[1:] != years[:-1]
+    )
+    starts = [0, *(np.flatnonzero(is_boundary) + 1)]
+    ends = [*starts[1:], arrow_table.num_rows]
+
+    return [
+        arrow_table.slice(start, end - start)
+        for start, end in zip(starts, ends)
+        if end > start
+    ]
+
+
+def write_parquet_dataset(
+    sm: SecurityMaster,
+    base_dir,
+    attribute_types: dict[str, type] | None = None,
+    row_group_size: int = 1 << 17,
+    compression: str = "zstd",
+    use_threads: bool = True,
+):
+    # Partitioned by asset_class and start year so readers can skip whole
+    # directories. Each partition is sorted by (security_id,
+    # effective_start_date), which keeps each row group's min/max statistics
+    # narrow, and partitions are written across threads
+    arrow_table, schema = to_arrow(sm, attribute_types)
+
+    # The dataset is written next to base_dir and swapped in once complete, so
+    # partitions of an earlier export never mix with the new ones
+    parent_dir, name = os.path.split(os.path.abspath(base_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    staging_dir = mkdtemp(prefix=f".{name}.", dir=parent_dir)
+
+    def write_partition(partition: pa.Table):
+        # Written with write_table rather than write_dataset, which doesn't
+        # keep row order. Partition values are only stored in the path
+        partition_dir = os.path.join(
+            staging_dir,
+            *(
+                f"{column}={to_hive_value(partition[column][0].as_py())}"
+                for column in ["asset_class", START_YEAR_COLUMN]
+            ),
+        )
+        os.makedirs(partition_dir)
+
+        pq.write_table(
+            partition.drop_columns(["asset_class", START_YEAR_COLUMN]),
+            os.path.join(partition_dir, "part-0.parquet"),
+            row_group_size=row_group_size,
+            compression=compression,
+        )
+
+    try:
+        with ThreadPoolExecutor(max_workers=None if use_threads else 1) as executor:
+            list(executor.map(write_partition, split_partitions(arrow_table)))
+    except BaseException:
+        shutil.rmtree(staging_dir)
+        raise
+
+    # A directory can't be renamed over a non-empty one, the old export is
+    # moved aside first and removed once the new one is in place
+    if os.path.exists(base_dir):
+        stale_dir = f"{staging_dir}.stale"
+        os.replace(base_dir, stale_dir)
+        os.replace(staging_dir, base_dir)
+        shutil.rmtree(stale_dir)
+    else:
+        os.replace(staging_dir, base_dir)
+
+    return schema, base_dir
+
+
+def read_parquet_dataset(
+    base_dir, schema, lazy: bool = False, query: MasterQuery | None = None
+):
+    query = query or MasterQuery()
+    dataset = ds.dataset(
+        base_dir,
+        schema=schema.append(pa.field(START_YEAR_COLUMN, pa.int32())),
+        format="parquet",
+        partitioning=get_dataset_partitioning(),
+    )
+    arrow_table = dataset.to_table(
+        columns=get_query_columns(query, schema.names),
+        filter=get_query_filter(query, partitioned=True),
+    )
+
+    # Partitions are read one after another, restore the master's row order
+    return from_arrow(
+        arrow_table.sort_by([(column, "ascending") for column in KEY_COLUMNS]), lazy
+    )
+
+
+def write_csv(sm, where, attribute_types: dict[str, type] | None = None):
+    arrow_table, schema = to_arrow(sm, attribute_types)
     convert_options = csv.ConvertOptions(
         column_types={field.name: field.type for field in schema},
         strings_can_be_null=True,
@@ -168,9 +666,21 @@ def write_csv(sm, where):
     return convert_options, where
 
 
-def read_csv(where, convert_options):
+def read_csv(
+    where, convert_options, lazy: bool = False, query: MasterQuery | None = None
+):
+    # CSV has no statistics or partitions to skip data with, the whole file is
+    # read and the query is applied afterwards
+    query = query or MasterQuery()
     arrow_table = csv.read_csv(where, convert_options=convert_options)
-    return from_arrow(arrow_table)
+    query_filter = get_query_filter(query)
+
+    if query_filter is not None:
+        arrow_table = arrow_table.filter(query_filter)
+
+    return from_arrow(
+        arrow_table.select(get_query_columns(query, arrow_table.column_names)), lazy
+    )
 
 
 def map_field_to_sql_column(field):
@@ -196,8 +706,9 @@ def write_sql(
     engine,
     metadata,
     table_name: str,
+    attribute_types: dict[str, type] | None = None,
 ):
-    arrow_table, schema = to_arrow(sm)
+    arrow_table, schema = to_arrow(sm, attribute_types)
     columns = list(map(map_field_to_sql_column, schema))
     sql_table = Table(table_name, metadata, *columns)
 
@@ -209,10 +720,121 @@ def write_sql(
     return schema, metadata
 
 
+def get_upsert(sql_table: Table, dialect_name: str):
+    upsert: SQLiteInsert | PostgreSQLInsert
+    if dialect_name == "sqlite":
+        upsert = sqlite_insert(sql_table)
+    elif dialect_name == "postgresql":
+        upsert = postgresql_insert(sql_table)
+    else:
+        raise Exception(f"Upserts are not supported for {dialect_name}")
+
+    return upsert.on_conflict_do_update(
+        index_elements=[column.name for column in sql_table.primary_key],
+        set_={
+            column.name: upsert.excluded[column.name]
+            for column in sql_table.columns
+            if not column.primary_key
+        },
+    )
+
+
+def get_delta_schema(
+    sm: SecurityMaster,
+    rows: SMData,
+    columns: list,
+    attribute_types: dict[str, type] | None,
+    table_types: dict[str, type],
+) -> pa.Schema:
+    # A delta write types each column from its declaration, the table it writes
+    # to or the changed rows. The master is only scanned for a column none of
+    # them can type, such as a column the changed rows leave empty in a new table
+    types = {**table_types, **(attribute_types or {})}
+    row_stats = compute_column_stats(sm.header, rows)
+
+    for column in sm.header:
+        row_type = get_column_type(row_stats[column])
+        if column not in types and row_type is not None:
+            types[column] = row_type
+
+    return get_schema(sm, columns, types)
+
+
+def upsert_sql(
+    sm: SecurityMaster,
+    engine,
+    metadata,
+    table_name: str,
+    change_set: ChangeSet | None = None,
+    batch_size: int = 10_000,
+    attribute_types: dict[str, type] | None = None,
+):
+    # Writes every row, or only the rows of a merge's change set, creating the
+    # table or adding new attribute columns as needed, all in one transaction
+    rows = (
+        sm.data
+        if change_set is None
+        else [
+            *change_set.inserted.values(),
+            *change_set.split.values(),
+            *change_set.updated.values(),
+        ]
+    )
+    value_columns = to_columns(rows) or [() for _ in sm.header]
+
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        has_table = inspector.has_table(table_name)
+        table_types = (
+            {
+                c["name"]: c["type"].python_type
+                for c in inspector.get_columns(table_name)
+            }
+            if has_table
+            else {}
+        )
+
+        if change_set is None:
+            schema = get_schema(sm, value_columns, attribute_types)
+        else:
+            schema = get_delta_schema(
+                sm, rows, value_columns, attribute_types, table_types
+            )
+        columns = list(map(map_field_to_sql_column, schema))
+
+        if has_table:
+            existing_columns = set(table_types)
+            quote = conn.dialect.identifier_preparer.quote
+
+            for column in columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=conn.dialect)
+                    conn.execute(
+                        text(
+                            f"ALTER TABLE {quote(table_name)} "
+                            f"ADD COLUMN {quote(column.name)} {column_type}"
+                        )
+                    )
+
+        sql_table = Table(table_name, metadata, *columns, extend_existing=True)
+        conn.execute(CreateTable(sql_table, if_not_exists=True))
+
+        upsert = get_upsert(sql_table, conn.dialect.name)
+        for i in range(0, len(rows), batch_size):
+            conn.execute(
+                upsert, [dict(zip(sm.header, row)) for row in rows[i : i + batch_size]]
+            )
+
+    return schema, metadata
+
+
 def read_sql(schema, engine, metadata, table_name: str):
     table = metadata.tables[table_name]
     with engine.connect() as conn:
-        rows = list(conn.execute(select(table)))
+        # Columns are selected by name, tables grown by upsert_sql add new
+        # columns at the end rather than in header order
+        columns = [table.c[name] for name in schema.names]
+        rows = list(conn.execute(select(*columns).order_by(*table.primary_key)))
 
     arrow_table, schema = to_arrow_with_schema(rows, schema)
     return from_arrow(arrow_table)
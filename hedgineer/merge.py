@@ -1,12 +1,47 @@
-from typing import Any
-
-from .collect import diff_row, extract_header, generate_sorted_flat_facts
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import chain, groupby, repeat
+from multiprocessing import get_context
+from operator import itemgetter
+from typing import Any, Callable, Iterable
+
+from .arrow import ArrowRows
+from .collect import (
+    build_fact_log,
+    diff_row,
+    extract_header,
+    generate_data_from_facts,
+    generate_sorted_flat_facts,
+)
 from .globals import ATTRIBUTE_PRIORITY
 from .io import format_sm
-from .types import AttributePair, AuditTrail, FlatFactSet, SecurityMaster
+from .sparse import SparseRows
+from .stats import (
+    add_row_stats,
+    project_column_stats,
+    remove_row_stats,
+    replace_row_stats,
+)
+from .types import (
+    AttributePair,
+    AuditTrail,
+    ChangeSet,
+    ColumnIndex,
+    FactLog,
+    FlatFactSet,
+    Header,
+    SecurityMaster,
+    SecurityRuns,
+    SMData,
+)
 from .utils import generate_none_tuple, replace_at_index
 
 
+def is_increasing(values: list[int]) -> bool:
+    return all(a < b for a, b in zip(values, values[1:]))
+
+
 def expand_attributes(
     sm: SecurityMaster,
     audit_trail_update: AuditTrail,
@@ -22,19 +57,52 @@ def expand_attributes(
     merged_column_index = {v: i for i, v in enumerate(merged_header)}
 
     data_length = len(sm.data)
-    old_data_as_cols = list(zip(*sm.data))
-    merged_data_as_cols = [
-        *map(lambda _: generate_none_tuple(data_length), range(len(merged_header))),
-    ]
 
-    for value in sm.header:
-        merged_data_as_cols[merged_column_index[value]] = old_data_as_cols[
-            sm.col_index[value]
-        ]
+    if merged_header == sm.header:
+        # Nothing to reshape, copy the rows so merges can't mutate the input
+        merged_data = sm.data[:]
+    elif isinstance(sm.data, ArrowRows):
+        merged_data = sm.data.select(merged_header)
+    elif isinstance(sm.data, SparseRows) and is_increasing(
+        positions := [merged_column_index[column] for column in sm.header]
+    ):
+        # Sparse rows only store their non-null values, so new columns are
+        # added by remapping each null layout rather than touching any row
+        merged_data = sm.data.expand(positions, len(merged_header))
+    elif merged_header[: len(sm.header)] == sm.header:
+        # New columns sort after every existing one, pad each row with Nones
+        padding = generate_none_tuple(len(new_columns))
+        merged_data = [row + padding for row in sm.data]
+    else:
+        # Reshape each row in a single pass, new columns read the None appended
+        # at the end of the row instead of transposing the whole table twice
+        reshape = itemgetter(
+            *(sm.col_index.get(column, len(sm.header)) for column in merged_header)
+        )
+        merged_data = [reshape(row + (None,)) for row in sm.data]
+
+    if isinstance(sm.data, SparseRows) and not isinstance(merged_data, SparseRows):
+        merged_data = SparseRows(merged_data, len(merged_header))
 
-    return SecurityMaster.from_tuple(
-        (merged_header, list(zip(*merged_data_as_cols)), merged_column_index)
+    merged_sm = SecurityMaster.from_tuple(
+        (merged_header, merged_data, merged_column_index),
+        validate=False,
     )
+    merged_sm.stats = project_column_stats(sm.stats, merged_header, data_length)
+    # Merges extend the log in place, it is copied so the input's log stays as is
+    merged_sm.facts = None if sm.facts is None else dict(sm.facts)
+
+    return merged_sm
+
+
+def set_row(sm: SecurityMaster, i: int, row: tuple):
+    replace_row_stats(sm.stats, sm.header, sm.data[i], row)
+    sm.data[i] = row
+
+
+def insert_row(sm: SecurityMaster, i: int, row: tuple):
+    add_row_stats(sm.stats, sm.header, row)
+    sm.data.insert(i, row)
 
 
 def get_value_diffs(
@@ -67,27 +135,32 @@ def cascade_new_values(
             if row[index] is None or row[index] == old_value:
                 row = replace_at_index(row, index, new_value)
 
-        sm.data[i] = row
+        set_row(sm, i, row)
 
     return sm
 
 
+def find_security_run(sm: SecurityMaster, security_id: int) -> tuple[int, int]:
+    # Rows are sorted by security_id, so a security's rows form one run that
+    # can be located with bisect instead of scanning the whole table
+    if isinstance(sm.data, ArrowRows):
+        return sm.data.find_run(security_id)
+
+    security_id_of = itemgetter(sm.col_index["security_id"])
+
+    return (
+        bisect_left(sm.data, security_id, key=security_id_of),
+        bisect_right(sm.data, security_id, key=security_id_of),
+    )
+
+
 def insert_new_security(sm: SecurityMaster, flat_fact: FlatFactSet) -> SecurityMaster:
     security_id, _, _ = flat_fact
     empty_row = generate_none_tuple(len(sm.col_index))
     new_row = diff_row(empty_row, sm.col_index, flat_fact)
 
-    if security_id > max(row[sm.col_index["security_id"]] for row in sm.data):
-        sm.data.append(new_row)
-    else:
-        for i, row in enumerate(sm.data):
-            s_id = row[sm.col_index["security_id"]]
-            insertion_index = i
-
-            if s_id > security_id:
-                break
-
-        sm.data.insert(insertion_index, new_row)
+    insertion_index, _ = find_security_run(sm, security_id)
+    insert_row(sm, insertion_index, new_row)
 
     return sm
 
@@ -106,7 +179,7 @@ def insert_before(
     )
 
     new_row_index = sm.data.index(row_to_insert_before)
-    sm.data.insert(new_row_index, new_row)
+    insert_row(sm, new_row_index, new_row)
 
     value_diffs = get_value_diffs(sm, new_row, flat_fact[2])
     return cascade_new_values(sm, flat_fact[0], new_row_index, value_diffs)
@@ -119,12 +192,16 @@ def insert_after(
 
     # Replace old end date
     prior_row_index = sm.data.index(row_to_insert_after)
-    sm.data[prior_row_index] = replace_at_index(
-        row_to_insert_after, sm.col_index["effective_end_date"], flat_fact[1]
+    set_row(
+        sm,
+        prior_row_index,
+        replace_at_index(
+            row_to_insert_after, sm.col_index["effective_end_date"], flat_fact[1]
+        ),
     )
 
     # Insert new row
-    sm.data.insert(prior_row_index + 1, new_row)
+    insert_row(sm, prior_row_index + 1, new_row)
 
     return sm
 
@@ -145,8 +222,12 @@ def split_row(sm: SecurityMaster, row_to_split: tuple, flat_fact: FlatFactSet):
     next_row = sm.data[split_index + 1]
 
     # Update end date for prior entry
-    sm.data[split_index] = replace_at_index(
-        row_to_split, sm.col_index["effective_end_date"], flat_fact[1]
+    set_row(
+        sm,
+        split_index,
+        replace_at_index(
+            row_to_split, sm.col_index["effective_end_date"], flat_fact[1]
+        ),
     )
 
     # Update start date of the new row
@@ -162,60 +243,332 @@ def split_row(sm: SecurityMaster, row_to_split: tuple, flat_fact: FlatFactSet):
     )
 
     # Insert the new row
-    sm.data.insert(split_index + 1, new_row)
+    insert_row(sm, split_index + 1, new_row)
 
     value_diffs = get_value_diffs(sm, new_row, flat_fact[2])
     return cascade_new_values(sm, flat_fact[0], split_index + 1, value_diffs)
 
 
-def merge_flat_fact(
-    sm: SecurityMaster,
+def merge_into_security(
+    security: SecurityMaster,
     flat_fact: FlatFactSet,
 ) -> SecurityMaster:
-    security_id, d, _ = flat_fact
-    security_rows = list(filter(lambda x: x[0] == security_id, sm.data))
+    # `security` holds the rows of a single security, so every lookup below
+    # costs time proportional to that security's history
+    _, d, _ = flat_fact
+    security_rows = security.data
+    start_date_of = itemgetter(security.col_index["effective_start_date"])
 
     if len(security_rows) == 0:
-        return insert_new_security(sm, flat_fact)
-    elif d < security_rows[0][1]:
+        return insert_new_security(security, flat_fact)
+    elif d < start_date_of(security_rows[0]):
         return insert_before(
-            sm,
+            security,
             security_rows[0],
             flat_fact,
         )
-    elif d > security_rows[-1][1]:
+    elif d > start_date_of(security_rows[-1]):
         return insert_after(
-            sm,
+            security,
             security_rows[-1],
             flat_fact,
         )
-    elif any(map(lambda x: x[1] == d, security_rows)):
-        row_to_merge_into = next(row for row in security_rows if row[1] == d)
-        return merge_into_row(
-            sm,
-            row_to_merge_into,
-            flat_fact,
-        )
+
+    row = security_rows[bisect_right(security_rows, d, key=start_date_of) - 1]
+
+    if start_date_of(row) == d:
+        return merge_into_row(security, row, flat_fact)
+    else:
+        return split_row(security, row, flat_fact)
+
+
+def get_security(sm: SecurityMaster, security_rows: SMData) -> SecurityMaster:
+    security = SecurityMaster.from_tuple(
+        (sm.header, security_rows, sm.col_index), validate=False
+    )
+    # Share the master's statistics so row changes are tracked against it
+    security.stats = sm.stats
+
+    return security
+
+
+def replay_security(sm: SecurityMaster, security_facts: AuditTrail) -> SMData:
+    # Rebuild a security's rows from its facts, exactly as a fresh build would
+    return generate_data_from_facts(
+        generate_sorted_flat_facts(security_facts), sm.col_index
+    )
+
+
+def replace_security_rows(
+    sm: SecurityMaster, old_rows: SMData, new_rows: SMData
+) -> SMData:
+    for row in old_rows:
+        remove_row_stats(sm.stats, sm.header, row)
+    for row in new_rows:
+        add_row_stats(sm.stats, sm.header, row)
+
+    return new_rows
+
+
+def merge_flat_fact(
+    sm: SecurityMaster,
+    flat_fact: FlatFactSet,
+) -> SecurityMaster:
+    security_id, d, kv_pairs = flat_fact
+    sm.invalidate_cache()
+
+    if sm.facts is not None:
+        sm.facts[security_id] = sm.facts.get(security_id, []) + [
+            (security_id, attribute, value, d) for attribute, value in kv_pairs
+        ]
+
+    def rebuild_run(security_id: int, security_rows: SMData) -> SMData:
+        if sm.facts is not None:
+            return replace_security_rows(
+                sm, security_rows, replay_security(sm, sm.facts[security_id])
+            )
+
+        return merge_into_security(get_security(sm, security_rows), flat_fact).data
+
+    if isinstance(sm.data, ArrowRows):
+        # Arrow-backed rows are never modified, a new table takes their place
+        sm.data = sm.data.splice([security_id], rebuild_run)
     else:
-        row_to_split = next(row for row in security_rows if row[1] <= d < row[2])
-        return split_row(sm, row_to_split, flat_fact)
+        start, end = find_security_run(sm, security_id)
+        sm.data[start:end] = rebuild_run(security_id, sm.data[start:end])
+
+    return sm
+
+
+def group_by_security(sm: SecurityMaster) -> SecurityRuns:
+    security_id_of = itemgetter(sm.col_index["security_id"])
+    return {
+        security_id: list(rows)
+        for security_id, rows in groupby(sm.data, security_id_of)
+    }
+
+
+def splice_security_runs(
+    sm: SecurityMaster,
+    security_ids: Iterable[int],
+    rebuild_run: Callable[[int, SMData], SMData],
+) -> SMData:
+    # Sort-merge sorted security ids against the sorted master in one pass:
+    # untouched runs are copied over as slices, touched runs are rebuilt
+    if isinstance(sm.data, ArrowRows):
+        return sm.data.splice(security_ids, rebuild_run)
+
+    # Sparse rows are copied over still encoded, only rebuilt runs are encoded
+    security_id_of = itemgetter(sm.col_index["security_id"])
+    merged_data = sm.data.empty_like() if isinstance(sm.data, SparseRows) else []
+    i = 0
+
+    for security_id in security_ids:
+        start = bisect_left(sm.data, security_id, lo=i, key=security_id_of)
+        end = bisect_right(sm.data, security_id, lo=start, key=security_id_of)
+        merged_data.extend(sm.data[i:start])
+        merged_data.extend(rebuild_run(security_id, sm.data[start:end]))
+        i = end
+
+    merged_data.extend(sm.data[i:])
+    return merged_data
+
+
+def merge_sorted_update(
+    sm: SecurityMaster, flat_facts: Iterable[FlatFactSet]
+) -> SMData:
+    facts_by_security = {
+        security_id: list(security_facts)
+        for security_id, security_facts in groupby(flat_facts, itemgetter(0))
+    }
+
+    def rebuild_run(security_id: int, security_rows: SMData) -> SMData:
+        security = get_security(sm, security_rows)
+        for flat_fact in facts_by_security[security_id]:
+            security = merge_into_security(security, flat_fact)
+
+        return security.data
+
+    return splice_security_runs(sm, facts_by_security, rebuild_run)
+
+
+def replay_update(
+    sm: SecurityMaster, audit_trail_update: AuditTrail
+) -> tuple[SMData, FactLog]:
+    # Only the securities named in the update are replayed, each from its own
+    # log, so the cost of a late fact scales with that security's history
+    fact_log = dict(sm.facts or {})
+    update_log = build_fact_log(audit_trail_update)
+
+    for security_id, security_facts in update_log.items():
+        fact_log[security_id] = fact_log.get(security_id, []) + security_facts
+
+    def rebuild_run(security_id: int, security_rows: SMData) -> SMData:
+        return replace_security_rows(
+            sm, security_rows, replay_security(sm, fact_log[security_id])
+        )
+
+    return splice_security_runs(sm, sorted(update_log), rebuild_run), fact_log
+
+
+def merge_security_partition(
+    partition: list[tuple[int, SMData, AuditTrail]],
+    header: Header,
+    col_index: ColumnIndex,
+    replay: bool,
+) -> list[tuple[int, SMData]]:
+    # Runs in a worker without stats, the caller updates them when stitching
+    sm = SecurityMaster.from_tuple((header, [], col_index), validate=False)
+    merged_runs = []
+
+    for security_id, security_rows, security_facts in partition:
+        if replay:
+            merged_runs.append((security_id, replay_security(sm, security_facts)))
+            continue
+
+        security = get_security(sm, security_rows)
+        for flat_fact in generate_sorted_flat_facts(security_facts):
+            security = merge_into_security(security, flat_fact)
+
+        merged_runs.append((security_id, security.data))
+
+    return merged_runs
+
+
+def merge_update_in_parallel(
+    sm: SecurityMaster, audit_trail_update: AuditTrail, jobs: int
+) -> tuple[SMData, FactLog | None]:
+    # Facts for different securities never interact, so each security's run is
+    # merged independently and the runs are stitched back in security_id order
+    update_log = build_fact_log(audit_trail_update)
+    security_ids = sorted(update_log)
+    fact_log = sm.facts
+
+    if fact_log is not None:
+        fact_log = dict(fact_log)
+        for security_id, security_facts in update_log.items():
+            fact_log[security_id] = fact_log.get(security_id, []) + security_facts
+
+    tasks = []
+    for security_id in security_ids:
+        start, end = find_security_run(sm, security_id)
+        security_facts = (fact_log or update_log)[security_id]
+        tasks.append((security_id, list(sm.data[start:end]), security_facts))
+
+    partitions = list(filter(len, (tasks[i::jobs] for i in range(jobs))))
+
+    # Spawned rather than forked, as in generate_data_in_parallel
+    with ProcessPoolExecutor(
+        max_workers=jobs, mp_context=get_context("spawn")
+    ) as executor:
+        merged_runs = dict(
+            chain.from_iterable(
+                executor.map(
+                    merge_security_partition,
+                    partitions,
+                    repeat(sm.header),
+                    repeat(sm.col_index),
+                    repeat(fact_log is not None),
+                )
+            )
+        )
+
+    def rebuild_run(security_id: int, security_rows: SMData) -> SMData:
+        return replace_security_rows(sm, security_rows, merged_runs[security_id])
+
+    return splice_security_runs(sm, security_ids, rebuild_run), fact_log
+
+
+def is_row_covering(row: tuple, col_index: ColumnIndex, d: date) -> bool:
+    end_date = row[col_index["effective_end_date"]]
+    return row[col_index["effective_start_date"]] <= d and (
+        end_date is None or d < end_date
+    )
+
+
+def diff_security_runs(
+    sm: SecurityMaster, merged_sm: SecurityMaster, security_ids: Iterable[int]
+) -> ChangeSet:
+    # Only the runs of the given securities are compared, so the cost follows
+    # the size of the update rather than the size of the master
+    start_date_index = sm.col_index["effective_start_date"]
+    change_set = ChangeSet.model_construct(
+        header=merged_sm.header, inserted={}, split={}, updated={}
+    )
+
+    for security_id in security_ids:
+        start, end = find_security_run(sm, security_id)
+        old_rows = sm.data[start:end]
+        old_rows_by_start = {row[start_date_index]: row for row in old_rows}
+
+        start, end = find_security_run(merged_sm, security_id)
+        for row in merged_sm.data[start:end]:
+            d = row[start_date_index]
+            old_row = old_rows_by_start.get(d)
+
+            if old_row is None:
+                is_split = any(
+                    is_row_covering(covering_row, sm.col_index, d)
+                    for covering_row in old_rows
+                )
+                changes = change_set.split if is_split else change_set.inserted
+                changes[(security_id, d)] = row
+            elif old_row != row:
+                change_set.updated[(security_id, d)] = row
+
+    return change_set
 
 
 def merge_audit_trail_update(
     sm: SecurityMaster,
     audit_trail_update: AuditTrail,
     attribute_priority: dict[str, int],
+    bulk: bool = False,
+    jobs: int = 1,
+    capture_changes: bool = False,
 ):
     sm = expand_attributes(
         sm,
         audit_trail_update,
         attribute_priority,
     )
-
-    for flat_fact in generate_sorted_flat_facts(audit_trail_update):
-        sm = merge_flat_fact(
-            sm,
-            flat_fact,
+    fact_log = sm.facts
+
+    if jobs > 1:
+        merged_data, fact_log = merge_update_in_parallel(sm, audit_trail_update, jobs)
+    elif fact_log is not None:
+        merged_data, fact_log = replay_update(sm, audit_trail_update)
+    elif bulk or isinstance(sm.data, (ArrowRows, SparseRows)):
+        # Arrow-backed and sparse rows stay as they are, only the updated runs
+        # are converted
+        merged_data = merge_sorted_update(
+            sm, generate_sorted_flat_facts(audit_trail_update)
         )
+    else:
+        # Merge into a per-security store, so each fact only touches the rows
+        # of its own security, then lay the runs back out in security_id order
+        security_runs = group_by_security(sm)
 
-    return sm
+        for flat_fact in generate_sorted_flat_facts(audit_trail_update):
+            security_id, _, _ = flat_fact
+            security = get_security(sm, security_runs.get(security_id, []))
+            security_runs[security_id] = merge_into_security(security, flat_fact).data
+
+        merged_data = [
+            row for s_id in sorted(security_runs) for row in security_runs[s_id]
+        ]
+
+    if isinstance(sm.data, SparseRows) and not isinstance(merged_data, SparseRows):
+        merged_data = SparseRows(merged_data, len(sm.header))
+
+    merged_sm = SecurityMaster.from_tuple(
+        (sm.header, merged_data, sm.col_index), validate=False
+    )
+    merged_sm.stats = sm.stats
+    merged_sm.facts = fact_log
+
+    if capture_changes:
+        security_ids = sorted({fact[0] for fact in audit_trail_update})
+        return merged_sm, diff_security_runs(sm, merged_sm, security_ids)
+
+    return merged_sm
@@ -0,0 +1,132 @@
+import asyncio
+from collections import deque
+from time import monotonic
+from typing import Any, Awaitable, Callable
+
+from .io import parse_audit_trail_lines
+from .merge import merge_audit_trail_update
+from .types import AuditFact, BatchMetrics, SecurityMaster
+
+type QueuedFact = tuple[float, AuditFact]  # type: ignore
+
+
+async def tail_audit_trail(
+    path,
+    submit: Callable[[AuditFact], Awaitable[None]],
+    poll_interval: float = 0.5,
+    read_size: int = 1 << 20,
+    attribute_types: dict[str, type] | None = None,
+):
+    # Follows an append-only audit trail, a line still being written is held
+    # back until its newline arrives
+    partial_line = ""
+
+    with open(path, mode="r", newline="\n") as f:
+        while True:
+            chunk = f.read(read_size)
+
+            if len(chunk) == 0:
+                await asyncio.sleep(poll_interval)
+                continue
+
+            *lines, partial_line = (partial_line + chunk).split("\n")
+            complete_lines = filter(str.strip, lines)
+            for fact in parse_audit_trail_lines(complete_lines, attribute_types):
+                await submit(fact)
+
+
+class MergeService:
+    def __init__(
+        self,
+        sm: SecurityMaster,
+        attribute_priority: dict[str, int],
+        max_batch_size: int = 10_000,
+        max_batch_delay: float = 1.0,
+        max_queued_facts: int = 100_000,
+        on_batch: Callable[[SecurityMaster, BatchMetrics], Any] | None = None,
+        metrics_window: int = 1_000,
+    ):
+        if max_batch_size < 1:
+            raise Exception("max_batch_size must be at least 1")
+
+        self.sm = sm
+        self.attribute_priority = attribute_priority
+        self.max_batch_size = max_batch_size
+        self.max_batch_delay = max_batch_delay
+        self.on_batch = on_batch
+        self.metrics: deque[BatchMetrics] = deque(maxlen=metrics_window)
+        # Bounded, so producers wait whenever merging falls behind
+        self.queue: asyncio.Queue[QueuedFact] = asyncio.Queue(maxsize=max_queued_facts)
+
+    async def submit(self, fact: AuditFact):
+        await self.queue.put((monotonic(), fact))
+
+    async def next_batch(self) -> list[QueuedFact]:
+        # A batch closes once it is full or max_batch_delay after its first fact
+        batch = [await self.queue.get()]
+        deadline = monotonic() + self.max_batch_delay
+
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+
+            timeout = deadline - monotonic()
+            if timeout <= 0:
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except TimeoutError:
+                break
+
+        return batch
+
+    async def merge_batch(self, batch: list[QueuedFact]) -> BatchMetrics:
+        merge_start = monotonic()
+        facts = [fact for _, fact in batch]
+
+        # Merge off the event loop so tailers keep reading in the meantime, the
+        # master is replaced in one assignment so readers never see a partial merge
+        self.sm = await asyncio.to_thread(
+            merge_audit_trail_update, self.sm, facts, self.attribute_priority
+        )
+
+        merge_end = monotonic()
+        oldest_arrival = min(arrival for arrival, _ in batch)
+        metrics = BatchMetrics(
+            fact_count=len(facts),
+            security_count=len({fact[0] for fact in facts}),
+            queue_wait=merge_start - oldest_arrival,
+            merge_duration=merge_end - merge_start,
+            latency=merge_end - oldest_arrival,
+            queued_facts=self.queue.qsize(),
+        )
+        self.metrics.append(metrics)
+
+        if self.on_batch is not None:
+            self.on_batch(self.sm, metrics)
+
+        return metrics
+
+    async def run(self):
+        while True:
+            await self.merge_batch(await self.next_batch())
+
+
+async def serve(
+    service: MergeService,
+    paths: list,
+    poll_interval: float = 0.5,
+    attribute_types: dict[str, type] | None = None,
+):
+    # A failing tailer or merge cancels everything else and is raised here
+    async with asyncio.TaskGroup() as tasks:
+        for path in paths:
+            tasks.create_task(
+                tail_audit_trail(
+                    path, service.submit, poll_interval, attribute_types=attribute_types
+                )
+            )
+
+        tasks.create_task(service.run())
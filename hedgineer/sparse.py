@@ -0,0 +1,205 @@
+from array import array
+from collections.abc import MutableSequence
+from itertools import chain, compress, repeat
+from operator import is_not, itemgetter
+from typing import Iterable
+
+import numpy as np
+
+from .arrow import ArrowRows
+from .columnar import to_object_array
+from .types import SecurityMaster, SMData
+from .utils import rows_equal
+
+
+class SparseLayouts:
+    # Distinct null patterns ("layouts") seen across rows, one byte per column.
+    # They are shared by every SparseRows sliced from the same master so encoded
+    # rows can be copied as is. Attributes follow the asset class, so a master
+    # holds few distinct layouts however many rows it has
+    def __init__(self, width: int):
+        self.width = width
+        self.present: list[bytes] = []
+        self.decoders: list[itemgetter] = []
+        self.ids: dict[bytes, int] = {}
+
+    def layout_id(self, present: bytes) -> int:
+        if present not in self.ids:
+            # Each column reads its value, or the None appended after the values
+            value_count = sum(present)
+            positions, next_value = [], 0
+            for is_present in present:
+                positions.append(next_value if is_present else value_count)
+                next_value += is_present
+
+            self.ids[present] = len(self.present)
+            self.present.append(present)
+            self.decoders.append(itemgetter(*positions))
+
+        return self.ids[present]
+
+    def encode(self, row: tuple) -> tuple[int, tuple]:
+        if len(row) != self.width:
+            raise Exception(f"Row has {len(row)} values, expected {self.width}")
+
+        present = bytes(map(is_not, row, repeat(None)))
+        return self.layout_id(present), tuple(compress(row, present))
+
+    def decode(self, layout_id: int, values: tuple) -> tuple:
+        return self.decoders[layout_id]((*values, None))
+
+
+class SparseRows(MutableSequence):
+    # Rows stored as a layout id (4 bytes) plus a tuple of their non-null values,
+    # reads hand back the full-width tuples every other module expects
+    def __init__(
+        self,
+        rows: Iterable[tuple] = (),
+        width: int = 0,
+        layouts: SparseLayouts | None = None,
+    ):
+        self.layouts = SparseLayouts(width) if layouts is None else layouts
+        self.layout_ids = array("I")
+        self.values: list[tuple] = []
+        self.extend(rows)
+
+    @property
+    def width(self) -> int:
+        return self.layouts.width
+
+    def empty_like(self) -> "SparseRows":
+        return SparseRows(layouts=self.layouts)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            sliced = self.empty_like()
+            sliced.layout_ids = self.layout_ids[i]
+            sliced.values = self.values[i]
+            return sliced
+
+        return self.layouts.decode(self.layout_ids[i], self.values[i])
+
+    def __setitem__(self, i, row):
+        if isinstance(i, slice):
+            self.layout_ids[i], self.values[i] = self.encode_rows(row)
+            return
+
+        self.layout_ids[i], self.values[i] = self.layouts.encode(row)
+
+    def __delitem__(self, i):
+        del self.layout_ids[i]
+        del self.values[i]
+
+    def insert(self, i: int, row: tuple):
+        layout_id, values = self.layouts.encode(row)
+        self.layout_ids.insert(i, layout_id)
+        self.values.insert(i, values)
+
+    def extend(self, rows: Iterable[tuple]):
+        layout_ids, values = self.encode_rows(rows)
+        self.layout_ids.extend(layout_ids)
+        self.values.extend(values)
+
+    def encode_rows(self, rows: Iterable[tuple]) -> tuple[array, list[tuple]]:
+        # Rows sharing our layouts are already encoded and are copied as is
+        if isinstance(rows, SparseRows) and rows.layouts is self.layouts:
+            return rows.layout_ids, rows.values
+
+        layout_ids, values = array("I"), []
+        for row in rows:
+            layout_id, row_values = self.layouts.encode(row)
+            layout_ids.append(layout_id)
+            values.append(row_values)
+
+        return layout_ids, values
+
+    def __iter__(self):
+        decoders = self.layouts.decoders
+        for layout_id, values in zip(self.layout_ids, self.values):
+            yield decoders[layout_id]((*values, None))
+
+    def __eq__(self, other):
+        if not isinstance(other, (list, SparseRows)):
+            return NotImplemented
+
+        return rows_equal(self, other)
+
+    def __repr__(self):
+        return f"SparseRows({list(self)!r})"
+
+    def copy(self) -> "SparseRows":
+        return self[:]
+
+    def columns(self) -> list[list]:
+        # Gather every column at once with NumPy: each row's values are laid out
+        # back to back and a per-layout table gives each column's offset in a row
+        if len(self) == 0:
+            return []
+
+        flat_values = to_object_array([*chain.from_iterable(self.values), None])
+        lengths = np.fromiter(map(len, self.values), dtype=np.int64, count=len(self))
+        row_offsets = np.cumsum(lengths) - lengths
+
+        present = np.frombuffer(b"".join(self.layouts.present), dtype=np.uint8)
+        present = present.reshape(-1, self.width).astype(bool)
+        value_ranks = np.where(present, np.cumsum(present, axis=1) - 1, -1)
+        layout_ids = np.frombuffer(self.layout_ids, dtype=np.uint32)
+
+        null_position = len(flat_values) - 1
+        columns = []
+        for column_ranks in value_ranks.T:
+            ranks = column_ranks[layout_ids]
+            positions = np.where(ranks >= 0, row_offsets + ranks, null_position)
+            columns.append(flat_values[positions].tolist())
+
+        return columns
+
+    def expand(self, positions: list[int], width: int) -> "SparseRows":
+        # Move every column to its new position without touching row values,
+        # positions must be increasing so values stay in column order
+        layouts = SparseLayouts(width)
+        layout_map = array("I")
+
+        for present in self.layouts.present:
+            expanded = bytearray(width)
+            for position, is_present in zip(positions, present):
+                expanded[position] = is_present
+
+            layout_map.append(layouts.layout_id(bytes(expanded)))
+
+        expanded_rows = SparseRows(layouts=layouts)
+        expanded_rows.layout_ids = array(
+            "I", map(layout_map.__getitem__, self.layout_ids)
+        )
+        expanded_rows.values = list(self.values)
+
+        return expanded_rows
+
+
+def to_columns(data: SMData) -> list:
+    if isinstance(data, (SparseRows, ArrowRows)):
+        return data.columns()
+
+    return list(zip(*data))
+
+
+def to_sparse(sm: SecurityMaster) -> SecurityMaster:
+    sparse_sm = SecurityMaster.from_tuple(
+        (sm.header, SparseRows(sm.data, len(sm.header)), sm.col_index),
+        validate=False,
+    )
+    sparse_sm.stats, sparse_sm.facts = sm.stats, sm.facts
+
+    return sparse_sm
+
+
+def to_dense(sm: SecurityMaster) -> SecurityMaster:
+    dense_sm = SecurityMaster.from_tuple(
+        (sm.header, list(sm.data), sm.col_index), validate=False
+    )
+    dense_sm.stats, dense_sm.facts = sm.stats, sm.facts
+
+    return dense_sm
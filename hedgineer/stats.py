@@ -0,0 +1,131 @@
+from collections import Counter
+from datetime import date
+from typing import Any
+
+from .sparse import to_columns
+from .types import ColumnStats, Header, SecurityMaster, SMData, TableStats
+
+ORDERED_TYPES = (int, float, date)
+
+
+def add_value(stats: ColumnStats, value: Any):
+    if value is None:
+        stats.null_count += 1
+        return
+
+    value_type = type(value)
+    stats.type_counts[value_type] = stats.type_counts.get(value_type, 0) + 1
+
+    if len(stats.type_counts) > 1 or value_type not in ORDERED_TYPES:
+        stats.is_ordered, stats.min, stats.max = False, None, None
+    elif stats.is_ordered:
+        stats.min = value if stats.min is None else min(stats.min, value)
+        stats.max = value if stats.max is None else max(stats.max, value)
+
+
+def remove_value(stats: ColumnStats, value: Any):
+    if value is None:
+        stats.null_count -= 1
+        return
+
+    value_type = type(value)
+    stats.type_counts[value_type] -= 1
+
+    if stats.type_counts[value_type] == 0:
+        del stats.type_counts[value_type]
+
+
+def compute_stats_from_values(values: tuple) -> ColumnStats:
+    type_counts = Counter(map(type, values))
+    null_count = type_counts.pop(type(None), 0)
+    column_types = list(type_counts.keys())
+    is_ordered = len(column_types) <= 1 and all(
+        column_type in ORDERED_TYPES for column_type in column_types
+    )
+
+    if is_ordered and len(column_types) == 1:
+        non_null_values = [value for value in values if value is not None]
+        return ColumnStats(
+            null_count=null_count,
+            type_counts=dict(type_counts),
+            min=min(non_null_values),
+            max=max(non_null_values),
+        )
+
+    return ColumnStats(
+        null_count=null_count, type_counts=dict(type_counts), is_ordered=is_ordered
+    )
+
+
+def compute_column_stats(header: Header, data: SMData) -> TableStats:
+    if len(data) == 0:
+        return {column: ColumnStats() for column in header}
+
+    return {
+        column: compute_stats_from_values(values)
+        for column, values in zip(header, to_columns(data))
+    }
+
+
+def get_column_stats(sm: SecurityMaster) -> TableStats:
+    if sm.stats is None:
+        sm.stats = compute_column_stats(sm.header, sm.data)
+
+    return sm.stats
+
+
+def add_row_stats(stats: TableStats | None, header: Header, row: tuple):
+    if stats is None:
+        return
+
+    for column, value in zip(header, row):
+        add_value(stats[column], value)
+
+
+def remove_row_stats(stats: TableStats | None, header: Header, row: tuple):
+    if stats is None:
+        return
+
+    for column, value in zip(header, row):
+        remove_value(stats[column], value)
+
+
+def replace_row_stats(
+    stats: TableStats | None, header: Header, old_row: tuple, new_row: tuple
+):
+    if stats is None:
+        return
+
+    for column, old_value, new_value in zip(header, old_row, new_row):
+        if old_value is not new_value:
+            remove_value(stats[column], old_value)
+            add_value(stats[column], new_value)
+
+
+def project_column_stats(
+    stats: TableStats | None, header: Header, row_count: int
+) -> TableStats | None:
+    if stats is None:
+        return None
+
+    return {
+        column: (
+            stats[column].model_copy(deep=True)
+            if column in stats
+            else ColumnStats(null_count=row_count)
+        )
+        for column in header
+    }
+
+
+def is_column_empty(stats: ColumnStats) -> bool:
+    return len(stats.type_counts) == 0
+
+
+def get_column_type(stats: ColumnStats) -> type | None:
+    return next(iter(stats.type_counts)) if len(stats.type_counts) == 1 else None
+
+
+def get_empty_columns(sm: SecurityMaster) -> list[str]:
+    stats = get_column_stats(sm)
+    return [column for column in sm.header if is_column_empty(stats[column])]
@@ -0,0 +1,109 @@
+import os
+import pickle
+from heapq import merge
+from itertools import chain, groupby, islice
+from operator import itemgetter
+from tempfile import TemporaryDirectory
+from typing import Iterable, Iterator
+
+from .collect import extract_header_from_attributes, generate_data_from_facts
+from .types import AuditFact, FlatFactSet, SecurityMaster
+
+# Facts are pickled to spill files in blocks of this size, so that reading a run
+# back during the merge only holds one block per run in memory
+SPILL_BLOCK_SIZE = 4096
+
+
+def fact_sort_key(sequenced_fact: tuple[int, AuditFact]):
+    # The sequence number keeps the sort stable across runs, so facts sharing
+    # (security_id, effective_date) are applied in the order they were received
+    sequence, (security_id, _, _, effective_date) = sequenced_fact
+    return (security_id, effective_date, sequence)
+
+
+def spill_run(run: list[tuple[int, AuditFact]], path: str) -> str:
+    run.sort(key=fact_sort_key)
+
+    with open(path, mode="wb") as f:
+        for i in range(0, len(run), SPILL_BLOCK_SIZE):
+            pickle.dump(run[i : i + SPILL_BLOCK_SIZE], f, pickle.HIGHEST_PROTOCOL)
+
+    return path
+
+
+def read_run(path: str) -> Iterator[tuple[int, AuditFact]]:
+    with open(path, mode="rb") as f:
+        while True:
+            try:
+                block = pickle.load(f)
+            except EOFError:
+                return
+
+            yield from block
+
+
+def spill_sorted_runs(
+    audit_facts: Iterable[AuditFact],
+    max_buffered_facts: int,
+    spill_dir: str,
+    attributes: dict[str, None],
+) -> list[str]:
+    if max_buffered_facts < 1:
+        raise Exception("max_buffered_facts must be at least 1")
+
+    sequenced_facts = enumerate(audit_facts)
+    runs: list[str] = []
+
+    while run := list(islice(sequenced_facts, max_buffered_facts)):
+        attributes.update(dict.fromkeys(map(lambda x: x[1][1], run)))
+        runs.append(spill_run(run, os.path.join(spill_dir, f"run_{len(runs)}.pkl")))
+
+    return runs
+
+
+def external_sort_facts(
+    audit_facts: Iterable[AuditFact],
+    max_buffered_facts: int = 1_000_000,
+    spill_dir: str | None = None,
+    attributes: dict[str, None] | None = None,
+) -> Iterator[AuditFact]:
+    # Attribute keys are collected into `attributes` while the input is spilled,
+    # which has fully happened by the time the first fact is yielded
+    attributes = {} if attributes is None else attributes
+
+    with TemporaryDirectory(dir=spill_dir) as tmp_dir:
+        runs = spill_sorted_runs(audit_facts, max_buffered_facts, tmp_dir, attributes)
+        sorted_facts = merge(*map(read_run, runs), key=fact_sort_key)
+
+        yield from map(itemgetter(1), sorted_facts)
+
+
+def stream_flat_facts(sorted_facts: Iterable[AuditFact]) -> Iterator[FlatFactSet]:
+    for (security_id, effective_date), facts in groupby(
+        sorted_facts, key=itemgetter(0, 3)
+    ):
+        yield (security_id, effective_date, [(fact[1], fact[2]) for fact in facts])
+
+
+def generate_security_master_streaming(
+    audit_facts: Iterable[AuditFact],
+    attribute_priority: dict[str, int],
+    max_buffered_facts: int = 1_000_000,
+    spill_dir: str | None = None,
+) -> SecurityMaster:
+    attributes: dict[str, None] = {}
+    sorted_facts = external_sort_facts(
+        audit_facts, max_buffered_facts, spill_dir, attributes
+    )
+
+    # Pull the first fact so every run is spilled and the header is known
+    first_fact = next(sorted_facts, None)
+    header, col_index = extract_header_from_attributes(attributes, attribute_priority)
+
+    if first_fact is None:
+        return SecurityMaster.from_tuple((header, [], col_index), validate=False)
+
+    flat_facts = stream_flat_facts(chain([first_fact], sorted_facts))
+    data = generate_data_from_facts(flat_facts, col_index)
+
+    return SecurityMaster.from_tuple((header, data, col_index), validate=False)
@@ -0,0 +1,81 @@
+from datetime import date, timedelta
+from random import Random
+
+from .globals import (
+    COMPANY_NAMES,
+    CREDIT_RATINGS,
+    GICS_INDUSTRIES,
+    GICS_SECTORS,
+    TICKERS,
+)
+from .types import AuditTrail
+
+ASSET_CLASSES = ["equity", "fixed_income", "commodity", "cash", "derivative"]
+
+# Every attribute keeps a single value type so masters can round-trip through Arrow
+SYNTHETIC_ATTRIBUTES = {
+    "asset_class": lambda rng: rng.choice(ASSET_CLASSES),
+    "ticker": lambda rng: rng.choice(TICKERS),
+    "name": lambda rng: rng.choice(COMPANY_NAMES),
+    "market_cap": lambda rng: rng.randint(0, 1000000),
+    "gics_sector": lambda rng: rng.choice(GICS_SECTORS),
+    "gics_industry": lambda rng: rng.choice(GICS_INDUSTRIES),
+    "credit_rating": lambda rng: rng.choice(CREDIT_RATINGS),
+    "interest_rate": lambda rng: rng.randint(0, 1000),
+}
+
+START_DATE = date(2020, 1, 1)
+DAYS = 365 * 4
+
+
+def random_date(rng: Random) -> date:
+    return START_DATE + timedelta(days=rng.randrange(DAYS))
+
+
+def generate_synthetic_audit_trail(
+    fact_count: int, security_count: int, seed: int = 0
+) -> AuditTrail:
+    rng = Random(seed)
+    attributes = list(SYNTHETIC_ATTRIBUTES.keys())
+    audit_trail = []
+
+    for _ in range(fact_count):
+        key = rng.choice(attributes)
+        audit_trail.append(
+            (
+                rng.randrange(security_count),
+                key,
+                SYNTHETIC_ATTRIBUTES[key](rng),
+                random_date(rng),
+            )
+        )
+
+    return audit_trail
+
+
+def generate_synthetic_update(
+    fact_count: int, security_count: int, seed: int = 0
+) -> AuditTrail:
+    # Updates reuse the generator with a different stream and add a new attribute
+    update = generate_synthetic_audit_trail(fact_count, security_count, seed + 1)
+    rng = Random(seed + 2)
+
+    return [
+        (
+            (security_id, "coupon", rng.randint(0, 100), effective_date)
+            if i % 10 == 0
+            else (security_id, key, value, effective_date)
+        )
+        for i, (security_id, key, value, effective_date) in enumerate(update)
+    ]
+
+
+def generate_synthetic_positions(
+    position_count: int, security_count: int, seed: int = 0
+) -> list[tuple]:
+    rng = Random(seed + 3)
+
+    return [
+        (rng.randrange(security_count), rng.randint(1, 1000), random_date(rng))
+        for _ in range(position_count)
+    ]
@@ -1,17 +1,37 @@
+from collections.abc import MutableSequence
 from datetime import date
-from typing import Any
+from typing import Any, Callable
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, PrivateAttr
 
 # mypy complains about this Python 3.12 feature
 type AuditFact = tuple[int, str, Any, date]  # type: ignore
 type AuditTrail = list[AuditFact]  # type: ignore
 type Header = list[str]  # type: ignore
-type SMData = list[tuple]  # type: ignore
+type SMData = MutableSequence[tuple]  # type: ignore
 type ColumnIndex = dict[str, int]  # type: ignore
 type AttributePair = tuple[str, Any]  # type: ignore
 type FlatFactSet = tuple[int, date, list[AttributePair]]  # type: ignore
 type TableData = list[tuple]  # type: ignore
+type IntervalIndex = dict[int, tuple[list[date], list[tuple]]]  # type: ignore
+type FactLog = dict[int, AuditTrail]  # type: ignore
+type SecurityRuns = dict[int, SMData]  # type: ignore
+type SecurityBlocks = dict[int, tuple[tuple, ...]]  # type: ignore
+type ChangeKey = tuple[int, date]  # type: ignore
+type PartitionIndex = dict[Any, tuple[list[int], list[str]]]  # type: ignore
+
+
+class ColumnStats(BaseModel):
+    null_count: int = 0
+    type_counts: dict[type, int] = {}
+    # Bounds over every value seen, they may be wider than the current values.
+    # Only kept while the column holds a single ordered type (ints, floats, dates)
+    is_ordered: bool = True
+    min: Any = None
+    max: Any = None
+
+
+type TableStats = dict[str, ColumnStats]  # type: ignore
 
 
 class SecurityMaster(BaseModel):
@@ -19,21 +39,115 @@ class SecurityMaster(BaseModel):
     data: SMData
     col_index: ColumnIndex
 
+    # Indexes derived from data, built lazily and dropped whenever data changes
+    _cache: dict[str, Any] = PrivateAttr(default_factory=dict)
+    # Column statistics, kept up to date by merges rather than rebuilt
+    _stats: TableStats | None = PrivateAttr(default=None)
+    # Source facts per security, kept when merges should replay rather than cascade
+    _facts: FactLog | None = PrivateAttr(default=None)
+
     @classmethod
-    def from_tuple(cls, t: tuple[Header, SMData, ColumnIndex]):
+    def from_tuple(cls, t: tuple[Header, SMData, ColumnIndex], validate: bool = True):
+        # Internal transformations pass validate=False, validating every row costs
+        # O(rows) and their output is already well-formed
+        if not validate:
+            return cls.model_construct(header=t[0], data=t[1], col_index=t[2])
+
         return cls(header=t[0], data=t[1], col_index=t[2])
 
     def to_tuple(self):
         return (self.header, self.data, self.col_index)
 
+    def cached(self, key: str, build: Callable[["SecurityMaster"], Any]):
+        if key not in self._cache:
+            self._cache[key] = build(self)
+
+        return self._cache[key]
+
+    def is_cached(self, key: str) -> bool:
+        return key in self._cache
+
+    def invalidate_cache(self):
+        self._cache.clear()
+
+    @property
+    def stats(self) -> TableStats | None:
+        return self._stats
+
+    @stats.setter
+    def stats(self, stats: TableStats | None):
+        self._stats = stats
+
+    @property
+    def facts(self) -> FactLog | None:
+        return self._facts
+
+    @facts.setter
+    def facts(self, facts: FactLog | None):
+        self._facts = facts
+
+    def __eq__(self, other):
+        if not isinstance(other, SecurityMaster):
+            return NotImplemented
+
+        return self.to_tuple() == other.to_tuple()
+
 
 class JoinedPositions(BaseModel):
     header: Header
     data: TableData
 
     @classmethod
-    def from_tuple(cls, t: tuple[Header, TableData]):
+    def from_tuple(cls, t: tuple[Header, TableData], validate: bool = True):
+        if not validate:
+            return cls.model_construct(header=t[0], data=t[1])
+
         return cls(header=t[0], data=t[1])
 
     def to_tuple(self):
         return (self.header, self.data)
+
+
+class ChangeSet(BaseModel):
+    header: Header
+    # Rows keyed by (security_id, effective_start_date). Inserted rows start a
+    # new stretch of history, split rows were carved out of an existing row
+    # and updated rows changed their values or end date in place
+    inserted: dict[ChangeKey, tuple] = {}
+    split: dict[ChangeKey, tuple] = {}
+    updated: dict[ChangeKey, tuple] = {}
+
+
+class BatchMetrics(BaseModel):
+    fact_count: int
+    security_count: int
+    # Seconds from the oldest fact in the batch arriving to the merge starting,
+    # then to the merged master being published
+    queue_wait: float
+    merge_duration: float
+    latency: float
+    queued_facts: int
+
+
+class SecurityMasterVersion(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    version: int
+    header: Header
+    col_index: ColumnIndex
+    security_ids: tuple[int, ...]
+    # Each security's rows as an immutable block, a new version shares every
+    # block it didn't change with the version it was merged from
+    blocks: SecurityBlocks
+
+
+class MasterQuery(BaseModel):
+    # Restricts which rows and columns are read, a field left as None matches
+    # everything. The security_id range is inclusive, and rows match when their
+    # effective dates overlap [effective_from, effective_to)
+    security_ids: set[int] | None = None
+    security_id_range: tuple[int, int] | None = None
+    effective_from: date | None = None
+    effective_to: date | None = None
+    asset_classes: list[str | None] | None = None
+    columns: list[str] | None = None
@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from operator import eq
 from random import choice, randint
 from typing import Any
 
@@ -21,6 +22,11 @@ def generate_none_tuple(length):
     return tuple(map(lambda _: None, range(length)))
 
 
+def rows_equal(rows, other) -> bool:
+    # Compared with ==, as tuple.__eq__ returns NotImplemented for non-tuples
+    return len(rows) == len(other) and all(map(eq, rows, other))
+
+
 def deeply_spread(dd: dict[Any, Any]):
     result: list = []
 
@@ -0,0 +1,123 @@
+from itertools import chain, groupby
+from operator import itemgetter
+from threading import Lock
+
+from .collect import generate_sorted_flat_facts
+from .merge import (
+    expand_attributes,
+    get_security,
+    group_by_security,
+    merge_into_security,
+)
+from .types import AuditTrail, SecurityMaster, SecurityMasterVersion
+
+
+def to_version(sm: SecurityMaster, version: int = 0) -> SecurityMasterVersion:
+    blocks = {
+        security_id: tuple(rows) for security_id, rows in group_by_security(sm).items()
+    }
+
+    return SecurityMasterVersion.model_construct(
+        version=version,
+        header=list(sm.header),
+        col_index=dict(sm.col_index),
+        security_ids=tuple(blocks),
+        blocks=blocks,
+    )
+
+
+def to_security_master(version: SecurityMasterVersion) -> SecurityMaster:
+    blocks = map(version.blocks.__getitem__, version.security_ids)
+    data = list(chain.from_iterable(blocks))
+    return SecurityMaster.from_tuple(
+        (list(version.header), data, dict(version.col_index)), validate=False
+    )
+
+
+def merge_version(
+    version: SecurityMasterVersion,
+    audit_trail_update: AuditTrail,
+    attribute_priority: dict[str, int],
+) -> SecurityMasterVersion:
+    empty_sm = SecurityMaster.from_tuple(
+        (version.header, [], version.col_index), validate=False
+    )
+    empty_sm = expand_attributes(empty_sm, audit_trail_update, attribute_priority)
+
+    if empty_sm.header != version.header:
+        # New attributes widen every row, so no block can be shared
+        version = to_version(
+            expand_attributes(
+                to_security_master(version), audit_trail_update, attribute_priority
+            ),
+            version.version,
+        )
+
+    # Copy the block references only, untouched blocks stay shared
+    blocks = dict(version.blocks)
+
+    for security_id, security_facts in groupby(
+        generate_sorted_flat_facts(audit_trail_update), itemgetter(0)
+    ):
+        security = get_security(empty_sm, list(blocks.get(security_id, ())))
+        for flat_fact in security_facts:
+            security = merge_into_security(security, flat_fact)
+
+        blocks[security_id] = tuple(security.data)
+
+    security_ids = version.security_ids
+    if len(blocks) != len(security_ids):
+        security_ids = tuple(sorted(blocks))
+
+    return SecurityMasterVersion.model_construct(
+        version=version.version + 1,
+        header=empty_sm.header,
+        col_index=empty_sm.col_index,
+        security_ids=security_ids,
+        blocks=blocks,
+    )
+
+
+class VersionHistory:
+    # Writers merge under a lock, readers never take it: a version is never
+    # changed once built, and publishing it is a single reference assignment
+    def __init__(
+        self,
+        sm: SecurityMaster,
+        attribute_priority: dict[str, int],
+        retain: int = 10,
+    ):
+        if retain < 1:
+            raise Exception("retain must be at least 1")
+
+        self.attribute_priority = attribute_priority
+        self.retain = retain
+        self._current = to_version(sm)
+        self._versions = {self._current.version: self._current}
+        self._writer = Lock()
+
+    @property
+    def current(self) -> SecurityMasterVersion:
+        return self._current
+
+    def get(self, version: int) -> SecurityMasterVersion:
+        retained_version = self._versions.get(version)
+
+        if retained_version is None:
+            raise Exception(f"Version {version} is not retained")
+
+        return retained_version
+
+    def publish(self, audit_trail_update: AuditTrail) -> SecurityMasterVersion:
+        with self._writer:
+            version = merge_version(
+                self._current, audit_trail_update, self.attribute_priority
+            )
+            self._versions[version.version] = version
+            self._current = version
+
+            # Readers still holding a dropped version keep it alive themselves
+            for old_version in list(self._versions)[: -self.retain]:
+                del self._versions[old_version]
+
+        return version
@@ -0,0 +1,147 @@
+from datetime import date
+
+import pyarrow as pa
+from pytest import fixture, raises
+
+from hedgineer.arrow import ArrowRows
+from hedgineer.collect import (
+    as_of,
+    filter_by_asset_class,
+    generate_security_master,
+    join_positions,
+    join_positions_bulk,
+)
+from hedgineer.globals import (
+    ATTRIBUTE_PRIORITY,
+    AUDIT_TRAIL,
+    AUDIT_TRAIL_UPDATE,
+    POSITIONS_TABLE,
+)
+from hedgineer.io import from_arrow, read_parquet, to_arrow, write_parquet
+from hedgineer.merge import (
+    find_security_run,
+    merge_audit_trail_update,
+    merge_flat_fact,
+)
+from hedgineer.sparse import to_dense
+
+
+@fixture
+def security_master():
+    return generate_security_master(AUDIT_TRAIL, ATTRIBUTE_PRIORITY)
+
+
+@fixture
+def arrow_sm(security_master):
+    return from_arrow(to_arrow(security_master)[0], lazy=True)
+
+
+def test_arrow_rows(security_master, arrow_sm):
+    rows = arrow_sm.data
+
+    assert isinstance(rows, ArrowRows)
+    assert rows == security_master.data
+    assert rows != [list(row) for row in security_master.data]
+    assert list(rows) == security_master.data
+    assert rows[1] == security_master.data[1] and rows[-1] == security_master.data[-1]
+    assert isinstance(rows[1:3], ArrowRows) and rows[1:3] == security_master.data[1:3]
+    assert rows[::2] == security_master.data[::2]
+    assert rows.columns() == [list(c) for c in zip(*security_master.data)]
+    assert rows.index(security_master.data[2]) == 2
+
+    with raises(IndexError):
+        rows[len(rows)]
+    with raises(Exception):
+        rows[0] = rows[1]
+    with raises(Exception):
+        rows.append(rows[0])
+
+
+def test_arrow_security_master(security_master, arrow_sm):
+    assert arrow_sm == security_master
+    assert from_arrow(to_arrow(security_master)[0]) == security_master
+    assert to_dense(arrow_sm).data == security_master.data
+    assert to_arrow(arrow_sm)[0] is arrow_sm.data.table
+
+    for security_id in (1, 2, 3, 4):
+        assert find_security_run(arrow_sm, security_id) == find_security_run(
+            security_master, security_id
+        )
+
+
+def test_arrow_collect(security_master, arrow_sm):
+    for asset_class in ("equity", "fixed_income", "cash", None):
+        filtered_sm = filter_by_asset_class(arrow_sm, asset_class)
+        assert filtered_sm == filter_by_asset_class(security_master, asset_class)
+
+    for d in (date(2023, 1, 1), date(2024, 3, 22), date(2024, 6, 1)):
+        assert as_of(arrow_sm, d) == as_of(security_master, d)
+
+    assert join_positions(arrow_sm, POSITIONS_TABLE) == (
+        join_positions(security_master, POSITIONS_TABLE)
+    )
+    assert join_positions_bulk(arrow_sm, POSITIONS_TABLE) == (
+        join_positions_bulk(security_master, POSITIONS_TABLE)
+    )
+
+
+def test_arrow_merge(security_master, arrow_sm):
+    update = AUDIT_TRAIL_UPDATE + [(5, "ticker", "NEW", date(2024, 1, 1))]
+    expected_sm = merge_audit_trail_update(security_master, update, ATTRIBUTE_PRIORITY)
+
+    for bulk in (False, True):
+        merged_sm = merge_audit_trail_update(arrow_sm, update, ATTRIBUTE_PRIORITY, bulk)
+
+        assert isinstance(merged_sm.data, ArrowRows)
+        assert merged_sm == expected_sm
+        assert arrow_sm == security_master
+
+    # New columns take their type from the merged values
+    arrow_table, schema = to_arrow(merged_sm)
+    assert schema.field("new_key").type == pa.int64()
+    assert from_arrow(arrow_table) == expected_sm
+
+    _, change_set = merge_audit_trail_update(
+        arrow_sm, update, ATTRIBUTE_PRIORITY, capture_changes=True
+    )
+    _, expected_change_set = merge_audit_trail_update(
+        security_master, update, ATTRIBUTE_PRIORITY, capture_changes=True
+    )
+    assert change_set == expected_change_set
+
+    flat_fact = (1, date(2023, 1, 1), [("ticker", "OLD")])
+    assert merge_flat_fact(arrow_sm, flat_fact) == (
+        merge_flat_fact(security_master, flat_fact)
+    )
+    assert isinstance(arrow_sm.data, ArrowRows)
+
+
+def test_arrow_merge_column_types(security_master, arrow_sm):
+    # Ints are promoted to floats, as the dense merge keeps both
+    update = [(1, "market_cap", 1.5, date(2024, 1, 1))]
+    merged_sm = merge_audit_trail_update(arrow_sm, update, ATTRIBUTE_PRIORITY)
+
+    assert merged_sm.data.table["market_cap"].type == pa.float64()
+    assert merged_sm == merge_audit_trail_update(
+        security_master, update, ATTRIBUTE_PRIORITY
+    )
+
+    # A column can't hold both ints and strings, whether within a rebuilt run
+    # or across rebuilt and untouched ones
+    for security_id in (1, 99):
+        update = [(security_id, "market_cap", "big", date(2024, 1, 1))]
+        with raises(Exception) as e:
+            merge_audit_trail_update(arrow_sm, update, ATTRIBUTE_PRIORITY)
+
+        assert str(e.value).startswith(
+            "Column market_cap holds values of more than one type"
+        )
+
+
+def test_arrow_read_parquet(security_master, tmp_path):
+    path = tmp_path / "security_master.parquet"
+    schema, _ = write_parquet(security_master, path)
+    arrow_sm = read_parquet(path, schema, lazy=True)
+
+    assert isinstance(arrow_sm.data, ArrowRows)
+    assert arrow_sm == read_parquet(path, schema) == security_master
@@ -0,0 +1,54 @@
+from benchmarks.suite import SCALES, compare_to_baseline, run_scale
+from hedgineer.synthetic import (
+    SYNTHETIC_ATTRIBUTES,
+    generate_synthetic_audit_trail,
+    generate_synthetic_positions,
+    generate_synthetic_update,
+)
+
+
+def test_generate_synthetic_audit_trail():
+    audit_trail = generate_synthetic_audit_trail(500, 20, seed=1)
+
+    assert len(audit_trail) == 500
+    assert audit_trail == generate_synthetic_audit_trail(500, 20, seed=1)
+    assert audit_trail != generate_synthetic_audit_trail(500, 20, seed=2)
+    assert all(0 <= fact[0] < 20 for fact in audit_trail)
+    assert all(fact[1] in SYNTHETIC_ATTRIBUTES for fact in audit_trail)
+
+
+def test_generate_synthetic_update_and_positions():
+    update = generate_synthetic_update(100, 20)
+    positions = generate_synthetic_positions(50, 20)
+
+    assert any(fact[1] == "coupon" for fact in update)
+    assert len(positions) == 50
+
+
+def test_run_scale():
+    timings = run_scale(200, 10, seed=0, repeat=1)
+
+    assert set(timings.keys()) >= {
+        "generate_security_master",
+        "merge_audit_trail_update",
+        "join_positions",
+        "filter_by_asset_class",
+        "io_arrow",
+        "io_parquet",
+        "io_csv",
+        "io_sql",
+    }
+    assert all(seconds is not None and seconds >= 0 for seconds in timings.values())
+    assert list(SCALES.keys()) == ["xs", "s", "m", "l", "xl"]
+
+
+def test_compare_to_baseline():
+    baseline = {"results": {"xs": {"a": 1.0, "b": 1.0, "c": None}}}
+    results = {"results": {"xs": {"a": 1.1, "b": 1.5, "c": 2.0, "d": 9.0}}}
+
+    assert compare_to_baseline(results, baseline, 0.2) == [("xs", "b", 1.0, 1.5)]
+    assert compare_to_baseline(results, baseline, 0.6) == []
+
+    # A benchmark that now fails is reported whatever the tolerance
+    results["results"]["xs"]["a"] = None
+    assert compare_to_baseline(results, baseline, 0.6) == [("xs", "a", 1.0, None)]
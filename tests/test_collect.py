@@ -4,17 +4,29 @@ from pytest import fixture
 
 from hedgineer.collect import (
     accumulate_fact,
+    as_of,
+    as_of_many,
     bucket_fact,
     bucket_facts,
     deeply_spread,
     diff_row,
     extract_header,
+    filter_by_asset_class,
     flatten_and_sort_facts,
     generate_data_from_facts,
     generate_security_master,
     join_positions,
+    join_positions_bulk,
+    partition_audit_trail,
+    remove_empty_columns,
 )
-from hedgineer.globals import ATTRIBUTE_PRIORITY, POSITIONS_TABLE, TEST_AUDIT_TRAIL
+from hedgineer.globals import (
+    ATTRIBUTE_PRIORITY,
+    AUDIT_TRAIL,
+    POSITIONS_TABLE,
+    TEST_AUDIT_TRAIL,
+)
+from hedgineer.types import SecurityMaster
 from hedgineer.utils import generate_none_tuple, parse_date
 
 
@@ -495,3 +507,97 @@ def test_bucket_facts(audit_trail):
             date(2023, 3, 17): [("gics_sector", "financials")],
         },
     }
+
+
+def test_partition_audit_trail(audit_trail):
+    partitions = partition_audit_trail(audit_trail, 3)
+
+    assert sorted(sum(partitions, [])) == sorted(audit_trail)
+    for i, partition in enumerate(partitions):
+        assert all(hash(fact[0]) % 3 == i for fact in partition)
+
+
+def test_generate_security_master_parallel(attribute_priority):
+    sm = generate_security_master(AUDIT_TRAIL, attribute_priority, jobs=2)
+    expected_sm = generate_security_master(AUDIT_TRAIL, attribute_priority)
+
+    assert sm.header == expected_sm.header
+    assert sm.data == expected_sm.data
+    assert sm.col_index == expected_sm.col_index
+
+    sm = generate_security_master(AUDIT_TRAIL, attribute_priority, "columnar", 3)
+    assert sm.data == expected_sm.data
+
+
+def test_join_positions_bulk(security_master, positions_table):
+    jp = join_positions_bulk(security_master, positions_table)
+    expected_jp = join_positions(security_master, positions_table)
+
+    assert jp.header == expected_jp.header
+    assert jp.data == expected_jp.data
+
+
+def test_join_positions_bulk_edges(security_master):
+    positions_table = [
+        (1, 1, date(2023, 12, 31)),
+        (1, 2, date(2024, 3, 22)),
+        (2, 3, date(2024, 5, 22)),
+        (2, 4, date(2099, 1, 1)),
+        (9, 5, date(2024, 1, 1)),
+    ]
+
+    jp = join_positions_bulk(security_master, positions_table)
+    expected_jp = join_positions(security_master, positions_table)
+
+    assert jp.data == expected_jp.data
+    assert [row[1] for row in jp.data] == [2, 3, 4]
+    assert join_positions_bulk(security_master, []).data == []
+
+
+def test_as_of(security_master):
+    sm = as_of(security_master, date(2024, 3, 22))
+
+    assert sm.header == security_master.header
+    assert sm.col_index == security_master.col_index
+    assert sm.data == [security_master.data[1], security_master.data[4]]
+
+
+def test_as_of_many(security_master):
+    snapshots = as_of_many(security_master, [date(2023, 2, 1), date(2024, 6, 1)])
+
+    assert snapshots[date(2023, 2, 1)].data == [security_master.data[3]]
+    assert snapshots[date(2024, 6, 1)].data == [
+        security_master.data[2],
+        security_master.data[5],
+    ]
+
+
+def test_filter_by_asset_class(attribute_priority):
+    sm = generate_security_master(AUDIT_TRAIL, attribute_priority)
+
+    for asset_class in ["equity", "fixed_income", None, "cash"]:
+        filtered_sm = filter_by_asset_class(sm, asset_class)
+        expected_sm = remove_empty_columns(
+            SecurityMaster.from_tuple(
+                (
+                    sm.header,
+                    [row for row in sm.data if row[3] == asset_class],
+                    sm.col_index,
+                )
+            )
+        )
+
+        assert filtered_sm.header == expected_sm.header
+        assert filtered_sm.data == expected_sm.data
+        assert filtered_sm.col_index == expected_sm.col_index
+
+    assert filter_by_asset_class(sm, "fixed_income").header == [
+        "security_id",
+        "effective_start_date",
+        "effective_end_date",
+        "asset_class",
+        "ticker",
+        "gics_sector",
+        "interest_rate",
+        "market_cap",
+    ]
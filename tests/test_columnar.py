@@ -0,0 +1,112 @@
+from datetime import date, timedelta
+from random import Random
+
+import numpy as np
+from pytest import fixture, mark, raises
+
+from hedgineer.collect import (
+    extract_header,
+    generate_security_master,
+    join_positions,
+    join_positions_bulk,
+)
+from hedgineer.columnar import forward_fill_column, generate_data_columnar
+from hedgineer.globals import (
+    ATTRIBUTE_PRIORITY,
+    AUDIT_TRAIL,
+    TEST_AUDIT_TRAIL,
+    TEST_AUDIT_TRAIL_2,
+)
+
+
+@fixture
+def random_audit_trail():
+    rng = Random(42)
+    attributes = {
+        "asset_class": lambda: rng.choice(["equity", "fixed_income", None]),
+        "ticker": lambda: rng.choice(["AAA", "BBB", "CCC"]),
+        "market_cap": lambda: rng.randint(0, 1000),
+        "credit_rating": lambda: rng.choice(["AAA", "BB", "C"]),
+    }
+
+    audit_trail = []
+
+    # Few securities and dates so that facts collide on (security_id, date)
+    for _ in range(2000):
+        key = rng.choice(list(attributes.keys()))
+        audit_trail.append(
+            (
+                rng.randint(0, 20),
+                key,
+                attributes[key](),
+                date(2023, 1, 1) + timedelta(days=rng.randint(0, 30)),
+            )
+        )
+
+    return audit_trail
+
+
+def test_forward_fill_column():
+    column = forward_fill_column(
+        np.array([0, 2, 2, 4]),
+        np.array(["a", "b", "c", "d"], dtype=object),
+        np.array([True, False, False, True, False, False]),
+    )
+
+    assert column.tolist() == ["a", "a", "c", None, "d", "d"]
+
+
+def test_generate_data_columnar_empty():
+    assert generate_data_columnar([], {}) == []
+
+
+@mark.parametrize("audit_trail", [TEST_AUDIT_TRAIL, TEST_AUDIT_TRAIL_2, AUDIT_TRAIL])
+def test_engines_match(audit_trail):
+    python_sm = generate_security_master(audit_trail, ATTRIBUTE_PRIORITY, "python")
+    columnar_sm = generate_security_master(audit_trail, ATTRIBUTE_PRIORITY, "columnar")
+
+    assert columnar_sm.header == python_sm.header
+    assert columnar_sm.data == python_sm.data
+    assert columnar_sm.col_index == python_sm.col_index
+
+
+def test_engines_match_random(random_audit_trail):
+    python_sm = generate_security_master(
+        random_audit_trail, ATTRIBUTE_PRIORITY, "python"
+    )
+    columnar_sm = generate_security_master(
+        random_audit_trail, ATTRIBUTE_PRIORITY, "columnar"
+    )
+
+    assert columnar_sm.data == python_sm.data
+
+
+def test_generate_data_columnar(random_audit_trail):
+    _, col_index = extract_header(random_audit_trail, ATTRIBUTE_PRIORITY)
+    data = generate_data_columnar(random_audit_trail, col_index)
+
+    assert all(isinstance(row[col_index["security_id"]], int) for row in data)
+    assert all(isinstance(row[col_index["effective_start_date"]], date) for row in data)
+
+
+def test_unknown_engine():
+    with raises(Exception) as e:
+        generate_security_master(TEST_AUDIT_TRAIL, ATTRIBUTE_PRIORITY, "spark")
+
+    assert str(e.value) == "Unknown build engine: spark"
+
+
+def test_asof_match_random(random_audit_trail):
+    sm = generate_security_master(random_audit_trail, ATTRIBUTE_PRIORITY, "columnar")
+    rng = Random(7)
+    positions_table = [
+        (
+            rng.randint(-1, 22),
+            i,
+            date(2022, 12, 25) + timedelta(days=rng.randint(0, 45)),
+        )
+        for i in range(500)
+    ]
+
+    jp = join_positions_bulk(sm, positions_table)
+    assert jp.data == join_positions(sm, positions_table).data
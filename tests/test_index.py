@@ -0,0 +1,119 @@
+from datetime import date
+
+from pytest import fixture
+
+from hedgineer.collect import generate_security_master
+from hedgineer.globals import ATTRIBUTE_PRIORITY, TEST_AUDIT_TRAIL
+from hedgineer.index import (
+    build_interval_index,
+    build_partition_index,
+    find_row,
+    get_interval_index,
+    get_partition_index,
+    get_snapshots,
+    snapshot_key,
+)
+from hedgineer.merge import merge_flat_fact
+
+
+@fixture
+def security_master():
+    return generate_security_master(TEST_AUDIT_TRAIL, ATTRIBUTE_PRIORITY)
+
+
+def test_build_interval_index(security_master):
+    index = build_interval_index(security_master)
+
+    assert list(index.keys()) == [1, 2]
+    assert index[1][0] == [date(2024, 1, 1), date(2024, 3, 22), date(2024, 5, 23)]
+    assert index[1][1] == security_master.data[:3]
+    assert index[2][0] == [date(2023, 1, 1), date(2023, 3, 17), date(2024, 5, 23)]
+    assert index[2][1] == security_master.data[3:]
+
+
+def test_find_row(security_master):
+    index = build_interval_index(security_master)
+
+    assert find_row(security_master, index, 1, date(2024, 1, 1)) == (
+        security_master.data[0]
+    )
+    assert find_row(security_master, index, 1, date(2024, 3, 21)) == (
+        security_master.data[0]
+    )
+    assert find_row(security_master, index, 1, date(2024, 3, 22)) == (
+        security_master.data[1]
+    )
+    assert find_row(security_master, index, 1, date(2030, 1, 1)) == (
+        security_master.data[2]
+    )
+    assert find_row(security_master, index, 1, date(2023, 12, 31)) is None
+    assert find_row(security_master, index, 3, date(2024, 1, 1)) is None
+
+
+def test_get_interval_index_is_cached(security_master):
+    index = get_interval_index(security_master)
+    assert get_interval_index(security_master) is index
+
+    merge_flat_fact(security_master, (1, date(2023, 1, 1), [("ticker", "OLD")]))
+    new_index = get_interval_index(security_master)
+
+    assert new_index is not index
+    assert new_index[1][0][0] == date(2023, 1, 1)
+
+
+def test_get_snapshots(security_master):
+    snapshots = get_snapshots(
+        security_master, [date(2024, 4, 1), date(2022, 1, 1), date(2024, 4, 1)]
+    )
+
+    assert list(snapshots.keys()) == [date(2024, 4, 1), date(2022, 1, 1)]
+    assert snapshots[date(2024, 4, 1)] == [
+        security_master.data[1],
+        security_master.data[4],
+    ]
+    assert snapshots[date(2022, 1, 1)] == []
+    assert security_master.is_cached(snapshot_key(date(2024, 4, 1)))
+
+    cached_snapshots = get_snapshots(security_master, [date(2024, 4, 1)])
+    assert cached_snapshots[date(2024, 4, 1)] is snapshots[date(2024, 4, 1)]
+
+    merge_flat_fact(security_master, (3, date(2024, 1, 1), [("ticker", "ACME")]))
+    assert not security_master.is_cached(snapshot_key(date(2024, 4, 1)))
+
+    merged_snapshots = get_snapshots(security_master, [date(2024, 4, 1)])
+    assert len(merged_snapshots[date(2024, 4, 1)]) == 3
+
+
+def test_build_partition_index(security_master):
+    index = build_partition_index(security_master, "asset_class")
+
+    assert index == {
+        "equity": (
+            [0, 1, 2],
+            [
+                "security_id",
+                "effective_start_date",
+                "effective_end_date",
+                "asset_class",
+                "ticker",
+                "name",
+                "gics_industry",
+                "gics_sector",
+                "market_cap",
+            ],
+        ),
+        None: (
+            [3, 4, 5],
+            [
+                "security_id",
+                "effective_start_date",
+                "effective_end_date",
+                "ticker",
+                "gics_sector",
+                "market_cap",
+            ],
+        ),
+    }
+    assert get_partition_index(security_master, "asset_class") is (
+        get_partition_index(security_master, "asset_class")
+    )
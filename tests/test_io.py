@@ -1,6 +1,9 @@
+import os
 from datetime import date
 
 import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from pytest import fixture, raises
 from sqlalchemy import MetaData, create_engine
 
@@ -9,20 +12,38 @@ from hedgineer.collect import (
     generate_security_master,
     join_positions,
 )
-from hedgineer.globals import ATTRIBUTE_PRIORITY, TEST_AUDIT_TRAIL, POSITIONS_TABLE
+from hedgineer.globals import (
+    ATTRIBUTE_PRIORITY,
+    ATTRIBUTE_TYPES,
+    AUDIT_TRAIL,
+    AUDIT_TRAIL_UPDATE,
+    POSITIONS_TABLE,
+    TEST_AUDIT_TRAIL,
+)
 from hedgineer.io import (
     from_arrow,
     from_pandas,
+    iter_audit_trail_batches,
     parse_data_type,
+    read_audit_trail,
+    read_audit_trail_arrow,
     read_csv,
     read_parquet,
+    read_parquet_dataset,
     read_sql,
     to_arrow,
     to_pandas,
+    upsert_sql,
     write_csv,
     write_parquet,
+    write_parquet_dataset,
     write_sql,
 )
+from hedgineer.merge import merge_audit_trail_update
+from hedgineer.synthetic import generate_synthetic_audit_trail
+from hedgineer.types import MasterQuery, SecurityMaster
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
 
 
 @fixture
@@ -108,6 +129,52 @@ def test_write_parquet_read_parquet(security_master):
     assert converted_sm.col_index == security_master.col_index
 
 
+def test_write_parquet_dataset(tmp_path):
+    sm = generate_security_master(
+        generate_synthetic_audit_trail(2_000, 50, 0), ATTRIBUTE_PRIORITY
+    )
+    schema, base_dir = write_parquet_dataset(
+        sm, tmp_path / "security_master", row_group_size=16
+    )
+    sort_keys = [("security_id", "ascending"), ("effective_start_date", "ascending")]
+
+    for path in base_dir.rglob("*.parquet"):
+        assert path.parent.parent.parent == base_dir
+        assert path.parent.parent.name.startswith("asset_class=")
+        start_year = int(path.parent.name.removeprefix("effective_start_year="))
+
+        parquet_file = pq.ParquetFile(path)
+        partition = parquet_file.read()
+
+        assert partition == partition.sort_by(sort_keys)
+        start_dates = partition["effective_start_date"].to_pylist()
+        assert {d.year for d in start_dates} == {start_year}
+
+        for i in range(parquet_file.num_row_groups):
+            row_group = parquet_file.metadata.row_group(i)
+            assert row_group.num_rows <= 16
+            assert row_group.column(0).statistics.has_min_max
+
+    dataset = ds.dataset(base_dir, partitioning="hive")
+    arrow_table = dataset.to_table().select(schema.names).sort_by(sort_keys)
+
+    assert arrow_table.schema == schema
+    assert from_arrow(arrow_table) == sm
+
+    # A smaller export replaces the earlier one, none of its partitions remain
+    smaller_sm = generate_security_master(
+        generate_synthetic_audit_trail(200, 5, 1), ATTRIBUTE_PRIORITY
+    )
+    schema, base_dir = write_parquet_dataset(smaller_sm, base_dir)
+    read_sm = read_parquet_dataset(base_dir, schema)
+    keys = [row[:2] for row in read_sm.data]
+
+    assert len(read_sm.data) == len(smaller_sm.data)
+    assert len(set(keys)) == len(keys)
+    assert read_sm == smaller_sm
+    assert os.listdir(tmp_path) == ["security_master"]
+
+
 def test_write_csv_read_csv(security_master):
     convert_options, output_stream = write_csv(security_master, pa.BufferOutputStream())
     converted_sm = read_csv(pa.BufferReader(output_stream.getvalue()), convert_options)
@@ -127,3 +194,249 @@ def test_write_sql_read_sql(security_master):
     assert converted_sm.header == security_master.header
     assert converted_sm.data == security_master.data
     assert converted_sm.col_index == security_master.col_index
+
+
+def test_upsert_sql():
+    engine = create_engine("sqlite:///:memory:")
+    metadata = MetaData()
+    sm = generate_security_master(AUDIT_TRAIL, ATTRIBUTE_PRIORITY)
+
+    schema, metadata = upsert_sql(sm, engine, metadata, "security_master")
+    assert read_sql(schema, engine, metadata, "security_master") == sm
+
+    # A second full write upserts instead of failing on the primary key
+    schema, metadata = upsert_sql(sm, engine, metadata, "security_master")
+    assert read_sql(schema, engine, metadata, "security_master") == sm
+
+    merged_sm, change_set = merge_audit_trail_update(
+        sm, AUDIT_TRAIL_UPDATE, ATTRIBUTE_PRIORITY, capture_changes=True
+    )
+    merged_sm.stats = None
+    schema, metadata = upsert_sql(
+        merged_sm, engine, metadata, "security_master", change_set, batch_size=2
+    )
+
+    assert merged_sm.header != sm.header
+    assert read_sql(schema, engine, metadata, "security_master") == merged_sm
+    # Column types come from the table and the changed rows, not a master scan
+    assert merged_sm.stats is None
+
+
+def test_read_audit_trail_arrow():
+    for file_name in ("audit_trail.csv", "audit_trail_update.csv"):
+        path = os.path.join(DATA_PATH, file_name)
+        audit_trail = read_audit_trail(path)
+
+        for block_size in (1, 16, 1 << 26):
+            assert read_audit_trail_arrow(path, block_size) == audit_trail
+
+
+def test_read_audit_trail_arrow_spacing(tmp_path):
+    path = tmp_path / "audit_trail.csv"
+    path.write_text(
+        '"1",\t"name", "Lenz Therapeutics, Inc",  "03/22/24"\n'
+        '"2","market_cap", 549000 , "05/23/24"\n'
+        '"3", "ticker", "ACME", "01/01/24"\n'
+        '"4", "name", "Acme, ""The"" Co", "01/01/24"\n'
+        '"5", "name", "Say ""hi"", world", "01/01/24"\n'
+        '"6", "ticker", "", "01/01/24"'
+    )
+
+    assert read_audit_trail_arrow(path) == [
+        (1, "name", "Lenz Therapeutics, Inc", date(2024, 3, 22)),
+        (2, "market_cap", "549000 ", date(2024, 5, 23)),
+        (3, "ticker", "ACME", date(2024, 1, 1)),
+        (4, "name", 'Acme, "The" Co', date(2024, 1, 1)),
+        (5, "name", 'Say "hi", world', date(2024, 1, 1)),
+        (6, "ticker", "", date(2024, 1, 1)),
+    ]
+
+
+def test_read_audit_trail_arrow_unquoted(tmp_path):
+    path = tmp_path / "audit_trail.csv"
+    path.write_text(
+        "1, name, foo, 03/22/24\n"
+        '2, "ticker",  V , 01/01/23\n'
+        '3,name, "Acme, Inc", 01/01/24\n'
+    )
+
+    assert (
+        read_audit_trail_arrow(path)
+        == read_audit_trail(path)
+        == [
+            (1, "name", "foo", date(2024, 3, 22)),
+            (2, "ticker", "V ", date(2023, 1, 1)),
+            (3, "name", "Acme, Inc", date(2024, 1, 1)),
+        ]
+    )
+
+
+def test_iter_audit_trail_batches():
+    path = os.path.join(DATA_PATH, "audit_trail.csv")
+    batches = list(iter_audit_trail_batches(path))
+
+    assert batches[0].schema == pa.schema(
+        [
+            ("security_id", pa.int64()),
+            ("attribute", pa.string()),
+            ("value", pa.string()),
+            ("effective_date", pa.date32()),
+        ]
+    )
+    assert sum(batch.num_rows for batch in batches) == len(read_audit_trail(path))
+
+
+def test_read_audit_trail_attribute_types():
+    path = os.path.join(DATA_PATH, "audit_trail.csv")
+
+    assert read_audit_trail(path)[2] == (2, "market_cap", "549000", date(2024, 5, 23))
+    assert read_audit_trail(path, ATTRIBUTE_TYPES) == AUDIT_TRAIL
+
+    for block_size in (1, 16, 1 << 26):
+        assert read_audit_trail_arrow(path, block_size, ATTRIBUTE_TYPES) == AUDIT_TRAIL
+
+    batch = next(iter_audit_trail_batches(path, attribute_types=ATTRIBUTE_TYPES))
+    assert pa.types.is_union(batch.schema.field("value").type)
+
+    with raises(Exception):
+        read_audit_trail(path, {"ticker": int})
+
+    with raises(Exception):
+        read_audit_trail_arrow(path, attribute_types={"ticker": int})
+
+
+def test_read_audit_trail_attribute_types_spacing(tmp_path):
+    path = tmp_path / "audit_trail.csv"
+    path.write_text(
+        '"1", "listed", "03/22/24", "03/22/24"\n'
+        '"2", "market_cap", 549000 , "05/23/24"\n'
+        '"2", "price", " 1.5", "05/23/24"\n'
+    )
+    attribute_types = {**ATTRIBUTE_TYPES, "listed": date, "price": float}
+
+    assert read_audit_trail_arrow(path, attribute_types=attribute_types) == [
+        (1, "listed", date(2024, 3, 22), date(2024, 3, 22)),
+        (2, "market_cap", 549000, date(2024, 5, 23)),
+        (2, "price", 1.5, date(2024, 5, 23)),
+    ]
+    assert read_audit_trail(path, attribute_types) == read_audit_trail_arrow(
+        path, attribute_types=attribute_types
+    )
+
+
+def test_to_arrow_attribute_types():
+    path = os.path.join(DATA_PATH, "audit_trail.csv")
+    sm = generate_security_master(
+        read_audit_trail(path, ATTRIBUTE_TYPES), ATTRIBUTE_PRIORITY
+    )
+    sm.stats = None
+
+    # Every column is declared, so the schema comes without computing stats
+    arrow_table, schema = to_arrow(sm, ATTRIBUTE_TYPES)
+    assert sm.stats is None
+    assert schema.field("market_cap").type == pa.int64()
+    assert schema == to_arrow(sm)[1]
+    assert from_arrow(arrow_table) == sm
+
+    # Facts of declared types merge cleanly with in-code ones
+    merged_sm = merge_audit_trail_update(sm, AUDIT_TRAIL_UPDATE, ATTRIBUTE_PRIORITY)
+    assert to_arrow(merged_sm, ATTRIBUTE_TYPES)[1].field("new_key").type == pa.int64()
+
+
+def query_security_master(sm: SecurityMaster, query: MasterQuery) -> SecurityMaster:
+    header = [
+        column
+        for column in sm.header
+        if query.columns is None
+        or column in ("security_id", "effective_start_date", *query.columns)
+    ]
+    rows = [dict(zip(sm.header, row)) for row in sm.data]
+
+    if query.security_ids is not None:
+        rows = [row for row in rows if row["security_id"] in query.security_ids]
+    if query.security_id_range is not None:
+        low, high = query.security_id_range
+        rows = [row for row in rows if low <= row["security_id"] <= high]
+    if query.effective_from is not None:
+        rows = [
+            row
+            for row in rows
+            if row["effective_end_date"] is None
+            or row["effective_end_date"] > query.effective_from
+        ]
+    if query.effective_to is not None:
+        rows = [row for row in rows if row["effective_start_date"] < query.effective_to]
+    if query.asset_classes is not None:
+        rows = [row for row in rows if row["asset_class"] in query.asset_classes]
+
+    return SecurityMaster.from_tuple(
+        (
+            header,
+            [tuple(row[column] for column in header) for row in rows],
+            {v: i for i, v in enumerate(header)},
+        )
+    )
+
+
+def test_read_with_query(tmp_path):
+    sm = generate_security_master(
+        generate_synthetic_audit_trail(2_000, 50, 0), ATTRIBUTE_PRIORITY
+    )
+    schema, base_dir = write_parquet_dataset(
+        sm, tmp_path / "security_master", row_group_size=16
+    )
+    write_parquet(sm, tmp_path / "security_master.parquet")
+    convert_options, _ = write_csv(sm, tmp_path / "security_master.csv")
+
+    queries = [
+        MasterQuery(),
+        MasterQuery(security_ids={3, 17, 1_000}),
+        MasterQuery(security_ids={999}),
+        MasterQuery(security_ids={999}, columns=["ticker"]),
+        MasterQuery(security_id_range=(10, 20), columns=["ticker"]),
+        MasterQuery(effective_from=date(2022, 3, 1), effective_to=date(2022, 6, 1)),
+        MasterQuery(asset_classes=["equity", None], columns=["asset_class", "name"]),
+        MasterQuery(
+            security_id_range=(0, 25),
+            effective_to=date(2021, 1, 1),
+            asset_classes=["fixed_income"],
+        ),
+    ]
+
+    for query in queries:
+        expected_sm = query_security_master(sm, query)
+
+        assert read_parquet_dataset(base_dir, schema, query=query) == expected_sm
+        assert read_parquet(base_dir.with_suffix(".parquet"), schema, query=query) == (
+            expected_sm
+        )
+        assert read_csv(base_dir.with_suffix(".csv"), convert_options, query=query) == (
+            expected_sm
+        )
+
+    with raises(Exception) as e:
+        read_parquet_dataset(base_dir, schema, query=MasterQuery(columns=["unknown"]))
+
+    assert str(e.value) == "Column unknown is not in the schema"
+
+
+def test_read_parquet_dataset_pruning(tmp_path):
+    sm = generate_security_master(
+        generate_synthetic_audit_trail(2_000, 50, 0), ATTRIBUTE_PRIORITY
+    )
+    schema, base_dir = write_parquet_dataset(sm, tmp_path / "security_master")
+
+    # Partitions the query rules out are never opened, so corrupting them
+    # doesn't affect the read
+    for path in base_dir.glob("asset_class=equity/*/*.parquet"):
+        path.write_bytes(b"not parquet")
+
+    query = MasterQuery(asset_classes=["fixed_income"])
+    assert read_parquet_dataset(base_dir, schema, True, query) == (
+        query_security_master(sm, query)
+    )
+
+    with raises(Exception):
+        read_parquet_dataset(
+            base_dir, schema, query=MasterQuery(asset_classes=["equity"])
+        )
@@ -2,9 +2,26 @@ from datetime import date
 
 from pytest import fixture
 
-from hedgineer.collect import extract_header
-from hedgineer.globals import ATTRIBUTE_PRIORITY, TEST_AUDIT_TRAIL
-from hedgineer.merge import cascade_new_values, get_value_diffs, merge_flat_fact
+from hedgineer.collect import (
+    build_fact_log,
+    extract_header,
+    generate_security_master,
+    generate_sorted_flat_facts,
+)
+from hedgineer.globals import ATTRIBUTE_PRIORITY, AUDIT_TRAIL, TEST_AUDIT_TRAIL
+from hedgineer.merge import (
+    cascade_new_values,
+    expand_attributes,
+    find_security_run,
+    get_value_diffs,
+    merge_audit_trail_update,
+    merge_flat_fact,
+)
+from hedgineer.stats import compute_column_stats
+from hedgineer.synthetic import (
+    generate_synthetic_audit_trail,
+    generate_synthetic_update,
+)
 from hedgineer.types import SecurityMaster
 
 
@@ -565,3 +582,170 @@ def test_merge_flat_fact_merge(extract_head, base_table):
             400,
         ),
     ]
+
+
+def test_find_security_run(extract_head, base_table):
+    header, col_index = extract_head
+    sm = SecurityMaster(header=header, data=base_table, col_index=col_index)
+
+    assert find_security_run(sm, 1) == (0, 3)
+    assert find_security_run(sm, 0) == (0, 0)
+    assert find_security_run(sm, 2) == (3, 3)
+
+
+def test_merge_audit_trail_update():
+    sm = generate_security_master(AUDIT_TRAIL[:12], ATTRIBUTE_PRIORITY)
+    update = AUDIT_TRAIL[12:] + [
+        (0, "ticker", "ACME", date(2024, 1, 1)),
+        (7, "ticker", "NEW", date(2024, 1, 1)),
+        (2, "ticker", "OLD", date(2020, 1, 1)),
+    ]
+
+    expected_sm = expand_attributes(sm, update, ATTRIBUTE_PRIORITY)
+    for flat_fact in generate_sorted_flat_facts(update):
+        expected_sm = merge_flat_fact(expected_sm, flat_fact)
+
+    merged_sm = merge_audit_trail_update(sm, update, ATTRIBUTE_PRIORITY)
+    bulk_merged_sm = merge_audit_trail_update(sm, update, ATTRIBUTE_PRIORITY, True)
+
+    assert merged_sm == expected_sm
+    assert bulk_merged_sm == expected_sm
+
+
+def test_merge_audit_trail_update_bulk_synthetic():
+    sm = generate_security_master(
+        generate_synthetic_audit_trail(2_000, 50, 1), ATTRIBUTE_PRIORITY
+    )
+    update = generate_synthetic_update(500, 60, 2)
+
+    assert merge_audit_trail_update(
+        sm, update, ATTRIBUTE_PRIORITY, True
+    ) == merge_audit_trail_update(sm, update, ATTRIBUTE_PRIORITY)
+
+
+def test_merge_audit_trail_update_replays_fact_log():
+    sm = generate_security_master(
+        AUDIT_TRAIL[:12], ATTRIBUTE_PRIORITY, retain_facts=True
+    )
+    update = AUDIT_TRAIL[12:] + [(7, "ticker", "NEW", date(2024, 1, 1))]
+    merged_sm = merge_audit_trail_update(sm, update, ATTRIBUTE_PRIORITY)
+
+    expected_sm = generate_security_master(
+        AUDIT_TRAIL[:12] + update, ATTRIBUTE_PRIORITY
+    )
+
+    assert merged_sm == expected_sm
+    assert merged_sm.facts == build_fact_log(AUDIT_TRAIL[:12] + update)
+    assert sm.facts == build_fact_log(AUDIT_TRAIL[:12])
+
+
+def test_merge_flat_fact_replays_fact_log():
+    audit_trail = [
+        (1, "ticker", "A", date(2024, 1, 1)),
+        (1, "ticker", "B", date(2024, 2, 1)),
+        (1, "ticker", "A", date(2024, 3, 1)),
+    ]
+    late_fact = (1, date(2024, 1, 1), [("ticker", "Z")])
+
+    sm = generate_security_master(audit_trail, ATTRIBUTE_PRIORITY, retain_facts=True)
+    sm.stats = compute_column_stats(sm.header, sm.data)
+
+    # Merging into an expanded copy leaves the original's log untouched
+    expanded_sm = expand_attributes(sm, audit_trail, ATTRIBUTE_PRIORITY)
+    merge_flat_fact(expanded_sm, late_fact)
+    assert sm.facts == build_fact_log(audit_trail)
+
+    sm = merge_flat_fact(sm, late_fact)
+
+    # Replay keeps the explicit A on 2024-03-01, the cascade overwrites it
+    assert [row[3] for row in sm.data] == ["Z", "B", "A"]
+    assert sm.stats["ticker"].type_counts == {str: 3}
+
+    cascaded_sm = generate_security_master(audit_trail, ATTRIBUTE_PRIORITY)
+    cascaded_sm = merge_flat_fact(cascaded_sm, late_fact)
+
+    assert [row[3] for row in cascaded_sm.data] == ["Z", "B", "Z"]
+
+
+def test_merge_audit_trail_update_in_parallel():
+    audit_trail = generate_synthetic_audit_trail(2_000, 50, 1)
+    update = generate_synthetic_update(500, 60, 2)
+
+    for retain_facts in (False, True):
+        sm = generate_security_master(
+            audit_trail, ATTRIBUTE_PRIORITY, retain_facts=retain_facts
+        )
+        sm.stats = compute_column_stats(sm.header, sm.data)
+
+        merged_sm = merge_audit_trail_update(sm, update, ATTRIBUTE_PRIORITY, jobs=3)
+        expected_sm = merge_audit_trail_update(sm, update, ATTRIBUTE_PRIORITY)
+
+        assert merged_sm == expected_sm
+        assert merged_sm.facts == expected_sm.facts
+        assert merged_sm.stats is not None and expected_sm.stats is not None
+        for column in merged_sm.header:
+            assert merged_sm.stats[column].type_counts == (
+                expected_sm.stats[column].type_counts
+            )
+            assert merged_sm.stats[column].null_count == (
+                expected_sm.stats[column].null_count
+            )
+
+
+def test_expand_attributes():
+    sm = generate_security_master(TEST_AUDIT_TRAIL, ATTRIBUTE_PRIORITY)
+    data = list(sm.data)
+
+    same_sm = expand_attributes(
+        sm, [(1, "ticker", "A", date(2024, 1, 1))], ATTRIBUTE_PRIORITY
+    )
+    assert same_sm == sm
+    assert same_sm.data is not sm.data
+
+    appended_sm = expand_attributes(
+        sm, [(1, "zeta", 1, date(2024, 1, 1))], ATTRIBUTE_PRIORITY
+    )
+    assert appended_sm.header == sm.header + ["zeta"]
+    assert appended_sm.data == [row + (None,) for row in data]
+
+    interleaved_sm = expand_attributes(
+        sm,
+        [(1, "alpha", 1, date(2024, 1, 1)), (1, "asset_class", "x", date(2024, 1, 1))],
+        ATTRIBUTE_PRIORITY,
+    )
+    alpha_index = interleaved_sm.col_index["alpha"]
+    assert interleaved_sm.data == [
+        (*row[:alpha_index], None, *row[alpha_index:]) for row in data
+    ]
+    assert sm.data == data
+
+
+def test_merge_audit_trail_update_capture_changes():
+    sm = generate_security_master(AUDIT_TRAIL, ATTRIBUTE_PRIORITY)
+    update = [
+        (1, "ticker", "X", date(2024, 2, 1)),
+        (1, "ticker", "Y", date(2024, 6, 1)),
+        (2, "market_cap", 1, date(2024, 5, 23)),
+        (3, "ticker", "OLD", date(2023, 1, 1)),
+        (4, "ticker", "NEW", date(2024, 1, 1)),
+    ]
+
+    for bulk in (False, True):
+        merged_sm, change_set = merge_audit_trail_update(
+            sm, update, ATTRIBUTE_PRIORITY, bulk, capture_changes=True
+        )
+
+        assert merged_sm == merge_audit_trail_update(sm, update, ATTRIBUTE_PRIORITY)
+        assert change_set.header == merged_sm.header
+        assert list(change_set.inserted) == [
+            (3, date(2023, 1, 1)),
+            (4, date(2024, 1, 1)),
+        ]
+        assert list(change_set.split) == [(1, date(2024, 2, 1)), (1, date(2024, 6, 1))]
+        assert list(change_set.updated) == [
+            (1, date(2024, 1, 1)),
+            (1, date(2024, 5, 23)),
+            (2, date(2024, 5, 23)),
+        ]
+        assert change_set.updated[(2, date(2024, 5, 23))] == merged_sm.data[7]
+        assert change_set.split[(1, date(2024, 2, 1))][4] == "X"
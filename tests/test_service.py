@@ -0,0 +1,82 @@
+import asyncio
+import os
+
+from pytest import fixture, raises
+
+from hedgineer.collect import generate_security_master
+from hedgineer.globals import ATTRIBUTE_PRIORITY, AUDIT_TRAIL
+from hedgineer.io import read_audit_trail
+from hedgineer.merge import merge_audit_trail_update
+from hedgineer.service import MergeService, serve
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+@fixture
+def security_master():
+    return generate_security_master(AUDIT_TRAIL, ATTRIBUTE_PRIORITY)
+
+
+def test_next_batch(security_master):
+    async def batches():
+        service = MergeService(
+            security_master, ATTRIBUTE_PRIORITY, max_batch_size=2, max_batch_delay=0.01
+        )
+        for fact in AUDIT_TRAIL[:3]:
+            await service.submit(fact)
+
+        return [await service.next_batch(), await service.next_batch()]
+
+    full_batch, partial_batch = asyncio.run(batches())
+
+    assert [fact for _, fact in full_batch] == AUDIT_TRAIL[:2]
+    assert [fact for _, fact in partial_batch] == AUDIT_TRAIL[2:3]
+
+
+def test_submit_backpressure(security_master):
+    async def submit_twice():
+        service = MergeService(security_master, ATTRIBUTE_PRIORITY, max_queued_facts=1)
+        await service.submit(AUDIT_TRAIL[0])
+        await asyncio.wait_for(service.submit(AUDIT_TRAIL[1]), 0.05)
+
+    with raises(TimeoutError):
+        asyncio.run(submit_twice())
+
+
+def test_serve(security_master, tmp_path):
+    update_path = os.path.join(DATA_PATH, "audit_trail_update.csv")
+    with open(update_path) as f:
+        lines = [line.rstrip("\n") + "\n" for line in f]
+
+    path = tmp_path / "audit_trail_update.csv"
+    path.write_text("")
+
+    async def tail_and_merge():
+        service = MergeService(
+            security_master, ATTRIBUTE_PRIORITY, max_batch_size=2, max_batch_delay=0.01
+        )
+        server = asyncio.create_task(serve(service, [path], poll_interval=0.01))
+
+        with open(path, mode="a") as f:
+            for line in lines:
+                # Write each line in two parts to exercise partial line handling
+                f.write(line[:5])
+                f.flush()
+                await asyncio.sleep(0.01)
+                f.write(line[5:])
+                f.flush()
+
+        while sum(metrics.fact_count for metrics in service.metrics) < len(lines):
+            await asyncio.sleep(0.01)
+
+        server.cancel()
+        return service
+
+    service = asyncio.run(asyncio.wait_for(tail_and_merge(), 10))
+    expected_sm = merge_audit_trail_update(
+        security_master, read_audit_trail(update_path), ATTRIBUTE_PRIORITY
+    )
+
+    assert service.sm == expected_sm
+    assert all(metrics.fact_count <= 2 for metrics in service.metrics)
+    assert all(metrics.latency >= metrics.merge_duration for metrics in service.metrics)
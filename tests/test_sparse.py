@@ -0,0 +1,124 @@
+from datetime import date
+
+from pytest import fixture, raises
+
+from hedgineer.collect import (
+    generate_security_master,
+    join_positions,
+    join_positions_bulk,
+)
+from hedgineer.globals import (
+    ATTRIBUTE_PRIORITY,
+    AUDIT_TRAIL,
+    AUDIT_TRAIL_UPDATE,
+    POSITIONS_TABLE,
+)
+from hedgineer.io import to_arrow
+from hedgineer.merge import expand_attributes, merge_audit_trail_update
+from hedgineer.sparse import SparseRows, to_columns, to_dense, to_sparse
+from hedgineer.stats import compute_column_stats
+
+
+@fixture
+def security_master():
+    return generate_security_master(AUDIT_TRAIL, ATTRIBUTE_PRIORITY)
+
+
+@fixture
+def rows():
+    return [
+        (1, "a", None, None),
+        (2, None, None, 3.0),
+        (3, "c", None, None),
+        (4, None, None, None),
+    ]
+
+
+def test_sparse_rows(rows):
+    sparse_rows = SparseRows(rows, 4)
+
+    assert sparse_rows == rows
+    assert sparse_rows != [list(row) for row in rows]
+    assert list(sparse_rows) == rows
+    assert sparse_rows[1] == rows[1] and sparse_rows[-1] == rows[-1]
+    assert sparse_rows[1:3] == rows[1:3]
+    assert len(sparse_rows.layouts.present) == 3
+    assert sparse_rows.values[0] == (1, "a")
+
+    sparse_rows[0] = (0, None, "b", None)
+    sparse_rows.insert(2, (5, "e", "e", 5.0))
+    sparse_rows[3:4] = [(6, None, None, None), (7, None, None, None)]
+    del sparse_rows[-1]
+
+    assert sparse_rows == [
+        (0, None, "b", None),
+        (2, None, None, 3.0),
+        (5, "e", "e", 5.0),
+        (6, None, None, None),
+        (7, None, None, None),
+    ]
+
+    with raises(Exception) as e:
+        sparse_rows.append((1, 2))
+
+    assert str(e.value) == "Row has 2 values, expected 4"
+
+
+def test_sparse_rows_columns(rows):
+    assert SparseRows(rows, 4).columns() == [list(c) for c in zip(*rows)]
+    assert SparseRows([], 4).columns() == []
+    assert to_columns(rows) == list(zip(*rows))
+
+
+def test_sparse_rows_expand(rows):
+    expanded_rows = SparseRows(rows, 4).expand([0, 2, 3, 5], 6)
+
+    assert expanded_rows == [
+        (row[0], None, row[1], row[2], None, row[3]) for row in rows
+    ]
+
+
+def test_sparse_security_master(security_master):
+    sparse_sm = generate_security_master(AUDIT_TRAIL, ATTRIBUTE_PRIORITY, sparse=True)
+
+    assert isinstance(sparse_sm.data, SparseRows)
+    assert sparse_sm == security_master
+    assert to_dense(sparse_sm).data == security_master.data
+    assert isinstance(to_sparse(security_master).data, SparseRows)
+
+    assert compute_column_stats(sparse_sm.header, sparse_sm.data) == (
+        compute_column_stats(security_master.header, security_master.data)
+    )
+    assert to_arrow(sparse_sm)[0] == to_arrow(security_master)[0]
+    assert join_positions(sparse_sm, POSITIONS_TABLE) == (
+        join_positions(security_master, POSITIONS_TABLE)
+    )
+    assert join_positions_bulk(sparse_sm, POSITIONS_TABLE) == (
+        join_positions_bulk(security_master, POSITIONS_TABLE)
+    )
+
+
+def test_sparse_merge(security_master):
+    sparse_sm = to_sparse(security_master)
+    update = AUDIT_TRAIL_UPDATE + [(3, "zeta", 1, date(2024, 1, 1))]
+
+    expanded_sm = expand_attributes(sparse_sm, update, ATTRIBUTE_PRIORITY)
+    assert isinstance(expanded_sm.data, SparseRows)
+    assert expanded_sm == expand_attributes(security_master, update, ATTRIBUTE_PRIORITY)
+
+    for bulk in (False, True):
+        merged_sm = merge_audit_trail_update(
+            sparse_sm, update, ATTRIBUTE_PRIORITY, bulk
+        )
+
+        assert isinstance(merged_sm.data, SparseRows)
+        assert merged_sm == merge_audit_trail_update(
+            security_master, update, ATTRIBUTE_PRIORITY, bulk
+        )
+
+    # Rows of untouched securities are copied over without being re-encoded
+    merged_sm = merge_audit_trail_update(
+        sparse_sm, [(1, "ticker", "NEW", date(2024, 1, 1))], ATTRIBUTE_PRIORITY
+    )
+    assert merged_sm.data.layouts is sparse_sm.data.layouts
+    assert merged_sm.data.values[-1] is sparse_sm.data.values[-1]
@@ -0,0 +1,86 @@
+from datetime import date
+
+from pytest import fixture
+
+from hedgineer.collect import filter_by_asset_class, generate_security_master
+from hedgineer.globals import ATTRIBUTE_PRIORITY, AUDIT_TRAIL, AUDIT_TRAIL_UPDATE
+from hedgineer.merge import merge_audit_trail_update
+from hedgineer.stats import (
+    add_value,
+    compute_column_stats,
+    get_column_stats,
+    get_column_type,
+    get_empty_columns,
+    remove_value,
+)
+from hedgineer.types import ColumnStats
+
+
+@fixture
+def security_master():
+    return generate_security_master(AUDIT_TRAIL, ATTRIBUTE_PRIORITY)
+
+
+def test_add_remove_value():
+    stats = ColumnStats()
+
+    for value in [3, None, 1, 2]:
+        add_value(stats, value)
+
+    assert stats.null_count == 1
+    assert stats.type_counts == {int: 3}
+    assert (stats.min, stats.max) == (1, 3)
+    assert get_column_type(stats) is int
+
+    add_value(stats, "a")
+    assert stats.type_counts == {int: 3, str: 1}
+    assert not stats.is_ordered
+    assert stats.min is None and stats.max is None
+    assert get_column_type(stats) is None
+
+    remove_value(stats, "a")
+    remove_value(stats, None)
+    assert stats.null_count == 0
+    assert get_column_type(stats) is int
+
+
+def test_compute_column_stats(security_master):
+    stats = compute_column_stats(security_master.header, security_master.data)
+
+    assert stats["security_id"].null_count == 0
+    assert (stats["security_id"].min, stats["security_id"].max) == (1, 3)
+    assert stats["effective_start_date"].min == date(2023, 1, 1)
+    assert stats["effective_end_date"].null_count == 3
+    assert stats["market_cap"].null_count == 5
+    assert stats["market_cap"].type_counts == {int: 2}
+    assert stats["ticker"].type_counts == {str: 7}
+    assert stats["ticker"].min is None
+
+
+def test_stats_maintained_by_merge(security_master):
+    get_column_stats(security_master)
+    sm = merge_audit_trail_update(
+        security_master, AUDIT_TRAIL_UPDATE, ATTRIBUTE_PRIORITY
+    )
+
+    expected_stats = compute_column_stats(sm.header, sm.data)
+    assert sm.stats is not None
+
+    for column in sm.header:
+        assert sm.stats[column].null_count == expected_stats[column].null_count
+        assert sm.stats[column].type_counts == expected_stats[column].type_counts
+
+        if expected_stats[column].min is not None:
+            assert sm.stats[column].min <= expected_stats[column].min
+            assert sm.stats[column].max >= expected_stats[column].max
+
+    # The master that was merged into keeps its own statistics
+    assert security_master.stats["market_cap"].type_counts == {int: 2}
+
+
+def test_get_empty_columns(security_master):
+    assert get_empty_columns(security_master) == []
+
+    sm = filter_by_asset_class(security_master, "equity")
+    assert "interest_rate" not in sm.header
+    assert get_empty_columns(sm) == []
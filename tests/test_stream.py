@@ -0,0 +1,98 @@
+import os
+from datetime import date
+
+from pytest import fixture, raises
+
+from hedgineer.collect import generate_security_master
+from hedgineer.globals import ATTRIBUTE_PRIORITY, AUDIT_TRAIL, TEST_AUDIT_TRAIL
+from hedgineer.io import iter_audit_trail, read_audit_trail
+from hedgineer.stream import (
+    external_sort_facts,
+    generate_security_master_streaming,
+    stream_flat_facts,
+)
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data")
+
+
+@fixture
+def audit_trail():
+    return TEST_AUDIT_TRAIL
+
+
+def test_external_sort_facts(audit_trail, tmp_path):
+    attributes: dict[str, None] = {}
+    sorted_facts = list(
+        external_sort_facts(iter(audit_trail), 5, str(tmp_path), attributes)
+    )
+
+    assert sorted_facts == sorted(audit_trail, key=lambda x: (x[0], x[3]))
+    assert set(attributes) == set(map(lambda x: x[1], audit_trail))
+    assert os.listdir(tmp_path) == []
+
+
+def test_external_sort_facts_is_stable():
+    facts = [
+        (1, "ticker", "A", date(2024, 1, 1)),
+        (1, "ticker", "B", date(2024, 1, 1)),
+        (0, "ticker", "C", date(2024, 1, 1)),
+        (1, "ticker", "D", date(2024, 1, 1)),
+    ]
+
+    assert list(external_sort_facts(facts, 1)) == [
+        facts[2],
+        facts[0],
+        facts[1],
+        facts[3],
+    ]
+
+
+def test_external_sort_facts_buffer_size():
+    with raises(Exception) as e:
+        list(external_sort_facts(TEST_AUDIT_TRAIL, 0))
+
+    assert str(e.value) == "max_buffered_facts must be at least 1"
+
+
+def test_stream_flat_facts():
+    facts = [
+        (1, "ticker", "A", date(2024, 1, 1)),
+        (1, "name", "B", date(2024, 1, 1)),
+        (1, "ticker", "C", date(2024, 2, 1)),
+        (2, "ticker", "D", date(2024, 1, 1)),
+    ]
+
+    assert list(stream_flat_facts(facts)) == [
+        (1, date(2024, 1, 1), [("ticker", "A"), ("name", "B")]),
+        (1, date(2024, 2, 1), [("ticker", "C")]),
+        (2, date(2024, 1, 1), [("ticker", "D")]),
+    ]
+
+
+def test_generate_security_master_streaming():
+    for max_buffered_facts in (1, 4, 100):
+        sm = generate_security_master_streaming(
+            iter(AUDIT_TRAIL), ATTRIBUTE_PRIORITY, max_buffered_facts
+        )
+        expected_sm = generate_security_master(AUDIT_TRAIL, ATTRIBUTE_PRIORITY)
+
+        assert sm.header == expected_sm.header
+        assert sm.data == expected_sm.data
+        assert sm.col_index == expected_sm.col_index
+
+
+def test_generate_security_master_streaming_from_file():
+    path = os.path.join(DATA_PATH, "audit_trail.csv")
+    sm = generate_security_master_streaming(
+        iter_audit_trail(path), ATTRIBUTE_PRIORITY, 3
+    )
+    expected_sm = generate_security_master(read_audit_trail(path), ATTRIBUTE_PRIORITY)
+
+    assert sm.data == expected_sm.data
+
+
+def test_generate_security_master_streaming_empty():
+    sm = generate_security_master_streaming(iter([]), ATTRIBUTE_PRIORITY)
+
+    assert sm.header == ["security_id", "effective_start_date", "effective_end_date"]
+    assert sm.data == []
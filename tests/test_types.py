@@ -0,0 +1,29 @@
+from datetime import date
+
+from pydantic import ValidationError
+from pytest import raises
+
+from hedgineer.types import JoinedPositions, SecurityMaster
+
+HEADER = ["security_id", "effective_start_date", "effective_end_date"]
+COL_INDEX = {v: i for i, v in enumerate(HEADER)}
+
+
+def test_from_tuple_validates():
+    with raises(ValidationError):
+        SecurityMaster.from_tuple((HEADER, [1, 2], COL_INDEX))
+
+    with raises(ValidationError):
+        JoinedPositions.from_tuple((HEADER, "rows"))
+
+
+def test_from_tuple_without_validation():
+    data = [(1, date(2024, 1, 1), None)]
+    sm = SecurityMaster.from_tuple((HEADER, data, COL_INDEX), validate=False)
+
+    assert sm.data is data
+    assert sm == SecurityMaster.from_tuple((HEADER, data, COL_INDEX))
+    assert sm.cached("key", lambda _: 1) == 1
+
+    jp = JoinedPositions.from_tuple((HEADER, data), validate=False)
+    assert jp.data is data
@@ -0,0 +1,93 @@
+from datetime import date
+from threading import Thread
+
+from pytest import fixture, raises
+
+from hedgineer.collect import generate_security_master
+from hedgineer.globals import ATTRIBUTE_PRIORITY, AUDIT_TRAIL, AUDIT_TRAIL_UPDATE
+from hedgineer.merge import merge_audit_trail_update
+from hedgineer.versioned import (
+    VersionHistory,
+    merge_version,
+    to_security_master,
+    to_version,
+)
+
+
+@fixture
+def security_master():
+    return generate_security_master(AUDIT_TRAIL, ATTRIBUTE_PRIORITY)
+
+
+def test_to_version(security_master):
+    version = to_version(security_master)
+
+    assert version.version == 0
+    assert version.security_ids == (1, 2, 3)
+    assert version.blocks[1] == tuple(security_master.data[:3])
+    assert to_security_master(version) == security_master
+
+
+def test_merge_version(security_master):
+    version = to_version(security_master)
+    update = [
+        (2, "ticker", "VV", date(2024, 6, 1)),
+        (4, "ticker", "A", date(2024, 1, 1)),
+    ]
+    merged_version = merge_version(version, update, ATTRIBUTE_PRIORITY)
+
+    assert merged_version.version == 1
+    assert merged_version.security_ids == (1, 2, 3, 4)
+    assert merged_version.blocks[1] is version.blocks[1]
+    assert merged_version.blocks[3] is version.blocks[3]
+    assert merged_version.blocks[2] is not version.blocks[2]
+    assert to_security_master(merged_version) == merge_audit_trail_update(
+        security_master, update, ATTRIBUTE_PRIORITY
+    )
+    assert to_security_master(version) == security_master
+
+
+def test_merge_version_new_attributes(security_master):
+    version = to_version(security_master)
+    merged_version = merge_version(version, AUDIT_TRAIL_UPDATE, ATTRIBUTE_PRIORITY)
+
+    assert to_security_master(merged_version) == merge_audit_trail_update(
+        security_master, AUDIT_TRAIL_UPDATE, ATTRIBUTE_PRIORITY
+    )
+    assert to_security_master(version) == security_master
+
+
+def test_version_history(security_master):
+    history = VersionHistory(security_master, ATTRIBUTE_PRIORITY, retain=2)
+    initial_version = history.current
+
+    for day in range(1, 4):
+        history.publish([(1, "ticker", f"T{day}", date(2024, 6, day))])
+
+    assert history.current.version == 3
+    assert history.get(2).version == 2
+    assert to_security_master(initial_version) == security_master
+
+    with raises(Exception) as e:
+        history.get(1)
+
+    assert str(e.value) == "Version 1 is not retained"
+
+
+def test_version_history_readers(security_master):
+    history = VersionHistory(security_master, ATTRIBUTE_PRIORITY)
+    seen = []
+
+    def read():
+        for _ in range(200):
+            version = history.current
+            rows = to_security_master(version).data
+            seen.append(len(rows) == 7 + version.version)
+
+    reader = Thread(target=read)
+    reader.start()
+    for day in range(1, 20):
+        history.publish([(1, "ticker", f"T{day}", date(2024, 6, day))])
+    reader.join()
+
+    assert all(seen)